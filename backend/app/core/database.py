@@ -1,29 +1,43 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import get_settings
 
 settings = get_settings()
 
-# Create database engine
+# Create database engine (scripts and background jobs)
 engine = create_engine(
     settings.database_url,
     pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20
+    pool_size=settings.database_pool_size,
+    max_overflow=settings.database_max_overflow
 )
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Create async database engine (API requests)
+async_engine = create_async_engine(
+    settings.async_database_url,
+    pool_pre_ping=True,
+    pool_size=settings.database_pool_size,
+    max_overflow=settings.database_max_overflow
+)
+
+# Create async session factory
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # Base class for models
 Base = declarative_base()
 
 
-def get_db():
-    """Dependency for getting database session."""
-    db = SessionLocal()
-    try:
+async def get_db():
+    """Dependency for getting async database session."""
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
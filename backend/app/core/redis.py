@@ -11,11 +11,8 @@ async def get_redis() -> redis.Redis:
     """Get Redis client."""
     global redis_client
     if redis_client is None:
-        redis_client = await redis.from_url(
-            settings.redis_url,
-            encoding="utf-8",
-            decode_responses=True
-        )
+        # Values are bytes encoded by app.utils.cache_codec
+        redis_client = await redis.from_url(settings.redis_url)
     return redis_client
 
 
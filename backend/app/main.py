@@ -1,14 +1,133 @@
+import asyncio
+from datetime import datetime, time, timedelta
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 from app.core.config import get_settings
-from app.core.database import Base, engine
+from app.core.database import Base, SessionLocal, async_engine
 from app.core.redis import close_redis
+from app.models.film import upgrade_schema
 from app.routes import films_router
+from app.routes.films import recommendation_engine
+from app.services import film_search
+from app.services.catalog_versions import FILMS, SIMILARITIES, bump_version, get_version
+from app.services import popular_films
+from app.services.popular_films import refresh_browsable_films
+from app.utils.cache import (
+    invalidate_namespace,
+    listen_for_invalidations,
+    set_namespace_generation
+)
 
 settings = get_settings()
 
 
+def refresh_neighbour_index() -> bool:
+    """Load or reload the in-memory neighbour index."""
+    db = SessionLocal()
+    try:
+        return recommendation_engine.refresh_neighbour_index(db)
+    finally:
+        db.close()
+
+
+def refresh_title_index() -> bool:
+    """Load or reload the in-memory autocomplete index."""
+    db = SessionLocal()
+    try:
+        return film_search.refresh_title_index(db)
+    finally:
+        db.close()
+
+
+async def watch_index(name: str, refresh, interval: int, on_reload=None):
+    """
+    Reload an in-memory index whenever the table it mirrors changes,
+    then await ``on_reload()`` if given.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if await asyncio.to_thread(refresh):
+                print(f"✅ {name} reloaded")
+                if on_reload is not None:
+                    await on_reload()
+        except Exception as e:
+            print(f"{name} refresh error: {e}")
+
+
+def refresh_facet_index() -> bool:
+    """Load or reload the in-memory facet index."""
+    db = SessionLocal()
+    try:
+        return popular_films.refresh_facet_index(db)
+    finally:
+        db.close()
+
+
+def get_similarities_version() -> int:
+    """
+    Version of the similarities this worker serves: the one the neighbour
+    index loaded when it is enabled, else the table's.
+    """
+    if recommendation_engine.neighbour_index is not None:
+        return recommendation_engine.neighbour_index.version
+    db = SessionLocal()
+    try:
+        return get_version(db, SIMILARITIES)
+    finally:
+        db.close()
+
+
+async def sync_similarity_caches():
+    """Tie cached similar films and recommendations to the similarities version."""
+    version = await asyncio.to_thread(get_similarities_version)
+    if await set_namespace_generation("similarities", version):
+        print(f"✅ Similarity caches moved to version {version}")
+
+
+async def watch_catalog_versions():
+    """Invalidate similarity caches whenever the similarities table is rebuilt."""
+    while True:
+        await asyncio.sleep(settings.catalog_version_poll_seconds)
+        try:
+            await sync_similarity_caches()
+        except Exception as e:
+            print(f"Catalog version sync error: {e}")
+
+
+def refresh_browsable_catalog() -> int:
+    """
+    Recompute which films the popular listing shows (release dates move).
+    Bumps the films version with the change, so every worker reloads its
+    facet index.
+    """
+    db = SessionLocal()
+    try:
+        updated = refresh_browsable_films(db)
+        if updated:
+            bump_version(db, FILMS)
+        db.commit()
+        return updated
+    finally:
+        db.close()
+
+
+async def watch_release_dates():
+    """Refresh the browsable catalog after every date rollover."""
+    while True:
+        now = datetime.now()
+        midnight = datetime.combine(now.date() + timedelta(days=1), time.min)
+        await asyncio.sleep((midnight - now).total_seconds() + 1)
+        try:
+            updated = await asyncio.to_thread(refresh_browsable_catalog)
+            if updated:
+                await invalidate_namespace("popular")
+                print(f"✅ Browsable catalog refreshed ({updated} films changed)")
+        except Exception as e:
+            print(f"Browsable catalog refresh error: {e}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan events for startup and shutdown."""
@@ -16,15 +135,66 @@ async def lifespan(app: FastAPI):
     print("🚀 Starting up...")
     
     # Create database tables
-    Base.metadata.create_all(bind=engine)
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(upgrade_schema)
     print("✅ Database tables created")
     
+    # Keep the local cache coherent with other workers
+    watchers = []
+    if settings.local_cache_enabled:
+        watchers.append(asyncio.create_task(listen_for_invalidations()))
+    
+    # Catch up on films released while the server was down
+    if await asyncio.to_thread(refresh_browsable_catalog):
+        await invalidate_namespace("popular")
+    watchers.append(asyncio.create_task(watch_release_dates()))
+    
+    # Load the in-memory indexes
+    await asyncio.to_thread(refresh_facet_index)
+    watchers.append(asyncio.create_task(watch_index(
+        "Facet index",
+        refresh_facet_index,
+        settings.facet_index_refresh_seconds
+    )))
+    print(f"✅ Facet index loaded ({popular_films.get_facet_index().size} films)")
+    
+    if settings.neighbour_index_enabled:
+        await asyncio.to_thread(refresh_neighbour_index)
+        watchers.append(asyncio.create_task(watch_index(
+            "Neighbour index",
+            refresh_neighbour_index,
+            settings.neighbour_index_refresh_seconds,
+            on_reload=sync_similarity_caches
+        )))
+        print(f"✅ Neighbour index loaded ({len(recommendation_engine.neighbour_index)} films)")
+    
+    # Drop cached recommendations computed from older similarities
+    # (after the neighbour index load: the version it serves counts)
+    await sync_similarity_caches()
+    watchers.append(asyncio.create_task(watch_catalog_versions()))
+    
+    if settings.title_index_enabled:
+        await asyncio.to_thread(refresh_title_index)
+        watchers.append(asyncio.create_task(watch_index(
+            "Title index",
+            refresh_title_index,
+            settings.title_index_refresh_seconds
+        )))
+        print(f"✅ Title index loaded ({len(film_search.get_title_index())} films)")
+    
     yield
     
     # Shutdown
     print("🛑 Shutting down...")
+    for watcher in watchers:
+        watcher.cancel()
+        with suppress(asyncio.CancelledError):
+            await watcher
     await close_redis()
     print("✅ Redis connection closed")
+    await async_engine.dispose()
+    print("✅ Database connections closed")
 
 
 # Create FastAPI app
@@ -1,3 +1,4 @@
 from app.models.film import Film, Similarity
+from app.models.catalog import CatalogVersion, FilmFacet
 
-__all__ = ["Film", "Similarity"]
+__all__ = ["Film", "Similarity", "CatalogVersion", "FilmFacet"]
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class CatalogVersion(Base):
+    """Version counter bumped whenever a derived dataset is rebuilt."""
+    __tablename__ = "catalog_versions"
+    
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class FilmFacet(Base):
+    """Number of films per facet value (genre, year), maintained on ingest."""
+    __tablename__ = "film_facets"
+    
+    facet = Column(String, primary_key=True)
+    value = Column(String, primary_key=True)
+    film_count = Column(Integer, nullable=False, default=0)
@@ -1,8 +1,14 @@
-from sqlalchemy import Column, Integer, String, Float, ARRAY, DateTime, Index, ForeignKey
-from sqlalchemy.sql import func
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Index, ForeignKey, DDL, event
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.sql import false, func
 from app.core.database import Base
 
 
+def search_key(expression):
+    """Accent- and case-folded form of a title, as indexed for search."""
+    return func.f_unaccent(func.lower(expression))
+
+
 class Film(Base):
     """Film model."""
     __tablename__ = "films"
@@ -23,6 +29,8 @@ class Film(Base):
     director = Column(String)
     actors = Column(ARRAY(String))
     keywords = Column(ARRAY(String))
+    # Eligible for the popular listing (see services/popular_films.py)
+    is_browsable = Column(Boolean, nullable=False, server_default=false())
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -30,6 +38,51 @@ class Film(Base):
     __table_args__ = (
         Index('ix_films_popularity_vote', 'popularity', 'vote_average'),
         Index('ix_films_annee_popularity', 'annee', 'popularity'),
+        # Substring search (LIKE '%q%' and similarity ranking)
+        Index(
+            'ix_films_titre_trgm',
+            search_key(titre).label('titre_key'),
+            postgresql_using='gin',
+            postgresql_ops={'titre_key': 'gin_trgm_ops'}
+        ),
+        Index(
+            'ix_films_titre_original_trgm',
+            search_key(titre_original).label('titre_original_key'),
+            postgresql_using='gin',
+            postgresql_ops={'titre_original_key': 'gin_trgm_ops'}
+        ),
+        # Prefix search on short queries (byte-order range scans)
+        Index('ix_films_titre_prefix', search_key(titre).collate('C')),
+        Index('ix_films_titre_original_prefix', search_key(titre_original).collate('C')),
+        # Genre filter of the popular listing
+        Index(
+            'ix_films_browsable_genres',
+            'genres',
+            postgresql_using='gin',
+            postgresql_where=is_browsable
+        ),
+    )
+
+
+# Sort keys of /films/popular (all descending, Film.id breaks ties).
+# NULLs are coalesced so keys compare as tuples for keyset pagination.
+POPULAR_SORT_KEYS = {
+    # Year, then popularity
+    "recent_popular": (func.coalesce(Film.annee, 0), func.coalesce(Film.popularity, 0.0)),
+    # "Mastodons" logic: high vote_count (proxy for admissions) first, so the
+    # most watched/rated films come first (Avengers, Interstellar), then rating
+    "rating": (func.coalesce(Film.vote_count, 0), func.coalesce(Film.vote_average, 0.0)),
+    "popularity": (func.coalesce(Film.popularity, 0.0),),
+}
+
+# One composite index per sort mode over browsable films only,
+# scanned backwards by the popular listing queries
+for sort_by, sort_key in POPULAR_SORT_KEYS.items():
+    Index(
+        f'ix_films_browsable_{sort_by}',
+        *sort_key,
+        Film.id,
+        postgresql_where=Film.is_browsable
     )
 
 
@@ -47,3 +100,36 @@ class Similarity(Base):
     __table_args__ = (
         Index('ix_similarity_film_score', 'film_id', 'score'),
     )
+
+
+# Search extensions and an IMMUTABLE unaccent wrapper usable in indexes
+SEARCH_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    """
+    CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    AS $func$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $func$
+    """,
+)
+for statement in SEARCH_DDL:
+    event.listen(Base.metadata, "before_create", DDL(statement))
+
+
+def upgrade_schema(connection) -> None:
+    """
+    Bring tables created by an older version up to date (create_all only
+    creates missing tables): search extensions, new columns and every
+    missing films index. Every statement is idempotent.
+    """
+    for statement in SEARCH_DDL:
+        connection.exec_driver_sql(statement)
+    connection.exec_driver_sql(
+        "ALTER TABLE films ADD COLUMN IF NOT EXISTS "
+        "is_browsable BOOLEAN NOT NULL DEFAULT false"
+    )
+    # Superseded by the partial ix_films_browsable_* indexes
+    for sort_by in POPULAR_SORT_KEYS:
+        connection.exec_driver_sql(f"DROP INDEX IF EXISTS ix_films_keyset_{sort_by}")
+    for index in Film.__table__.indexes:
+        index.create(connection, checkfirst=True)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 
 class FilmBase(BaseModel):
@@ -24,6 +24,20 @@ class FilmResponse(FilmBase):
         from_attributes = True
 
 
+class PopularFilmsPage(BaseModel):
+    """A page of popular films with the cursor of the next page."""
+    films: List[FilmResponse]
+    next_cursor: Optional[str] = None
+
+
+class FacetCountsResponse(BaseModel):
+    """Film counts per filter value of the popular catalog."""
+    total: int
+    genres: Dict[str, int]
+    years: Dict[int, int]
+    ratings: Dict[int, int]
+
+
 class FilmDetailResponse(FilmResponse):
     """Detailed film response with additional info."""
     overview: Optional[str] = None
@@ -64,3 +78,5 @@ class MetadataResponse(BaseModel):
     genres: List[str]
     min_year: Optional[int] = None
     max_year: Optional[int] = None
+    genre_counts: Dict[str, int] = {}
+    year_counts: Dict[int, int] = {}
@@ -1,20 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, or_, and_
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import Integer, any_, func, literal, select
+from typing import Dict, List, Optional
+from app.core.config import get_settings
 from app.core.database import get_db
 from app.models.film import Film
 from app.models.schemas import (
     FilmResponse,
     FilmDetailResponse,
     SimilarFilmsResponse,
+    PopularFilmsPage,
+    FacetCountsResponse,
     RecommendationRequest,
     RecommendationResponse,
     MetadataResponse
 )
-from app.services.recommendation_engine import RecommendationEngine
-from app.utils.cache import get_cached, set_cached
+from app.services.film_facets import GENRE, YEAR, get_facet_counts
+from app.services.film_search import get_title_index, search_films_by_title
+from app.services.popular_films import (
+    InvalidCursor,
+    get_facet_index,
+    get_popular_page,
+    popular_films_query,
+    popular_sort_key
+)
+from app.services.recommendation_engine import RecommendationEngine, recommendation_request_key
+from app.utils.cache import (
+    cached_json_response,
+    get_or_compute_many,
+    namespaced_key,
+    namespaced_keys
+)
+from app.utils.cache_codec import join_json_array, join_json_object
 
+settings = get_settings()
 router = APIRouter(prefix="/films", tags=["films"])
 recommendation_engine = RecommendationEngine()
 
@@ -27,231 +47,309 @@ async def get_popular_films(
     year: Optional[int] = None,
     min_rating: Optional[float] = None,
     sort_by: str = Query("recent_popular", regex="^(popularity|recent_popular|rating)$"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get popular films with optional filters."""
     # Create cache key
-    cache_key = f"popular:{page}:{limit}:{genre}:{year}:{min_rating}:{sort_by}"
-    
-    # Check cache
-    cached = await get_cached(cache_key)
-    if cached:
-        return cached
-    
-    # Build query
-    query = db.query(Film)
-    
-    # Apply filters
-    if genre:
-        query = query.filter(Film.genres.contains([genre]))
-    
-    if year:
-        query = query.filter(Film.annee == year)
-    
-    if min_rating:
-        query = query.filter(Film.vote_average >= min_rating)
-    
-    # Filter out Indian films and other specific languages (User Request)
-    excluded_languages = ['hi', 'te', 'ta', 'ml', 'kn', 'mr', 'bn', 'pa', 'gu']
-    query = query.filter(Film.original_language.notin_(excluded_languages))
-    
-    # Filter out specific unwanted films (User Request)
-    excluded_titles = ["High School of the Dead", "Highschool of the Dead"]
-    query = query.filter(Film.titre.notin_(excluded_titles))
-    
-    # Filter out films without posters (User Request)
-    query = query.filter(Film.poster_url.isnot(None))
-    
-    # Filter out unreleased films (User Request)
-    # Assuming release_date is stored as string YYYY-MM-DD
-    from datetime import datetime
-    today = datetime.now().strftime("%Y-%m-%d")
-    query = query.filter(Film.release_date <= today)
-    
-    # Apply sorting
-    if sort_by == "recent_popular":
-        # Sort by year desc, then popularity desc
-        query = query.order_by(Film.annee.desc(), Film.popularity.desc())
-    elif sort_by == "rating":
-        # "Mastodons" logic: High vote_count (proxy for admissions) AND High rating.
-        # Sorting by vote_count DESC ensures we get the most watched/rated films first (Avengers, Interstellar).
-        # Then by vote_average DESC to break ties (though ties in vote_count are rare for top films).
-        query = query.order_by(Film.vote_count.desc(), Film.vote_average.desc())
-    else:
-        # Default: popularity desc
-        query = query.order_by(Film.popularity.desc())
-    
-    # Paginate
-    offset = (page - 1) * limit
-    films = (
-        query
-        .offset(offset)
-        .limit(limit)
-        .all()
+    cache_key = await namespaced_key(
+        "popular", f"{page}:{limit}:{genre}:{year}:{min_rating}:{sort_by}"
     )
     
-    result = [FilmResponse.model_validate(film) for film in films]
+    async def load():
+        # Build query
+        query = popular_films_query(genre, year, min_rating)
+        
+        # Apply sorting (see POPULAR_SORT_KEYS)
+        query = query.order_by(*(column.desc() for column in popular_sort_key(sort_by)))
+        
+        # Paginate
+        offset = (page - 1) * limit
+        films = (
+            await db.execute(
+                query
+                .offset(offset)
+                .limit(limit)
+            )
+        ).scalars().all()
+        
+        return [FilmResponse.model_validate(film).model_dump() for film in films]
     
-    # Cache result
-    await set_cached(cache_key, [r.model_dump() for r in result])
+    # Cached, computed once per expiry across concurrent requests
+    return await cached_json_response(cache_key, load)
+
+
+@router.get("/popular/feed", response_model=PopularFilmsPage)
+async def get_popular_films_feed(
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    genre: Optional[str] = None,
+    year: Optional[int] = None,
+    min_rating: Optional[float] = None,
+    sort_by: str = Query("recent_popular", regex="^(popularity|recent_popular|rating)$"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get popular films with cursor pagination (infinite scroll).
+    Pass the returned next_cursor to get the following page.
+    """
+    # Create cache key
+    cache_key = await namespaced_key(
+        "popular", f"feed:{cursor}:{limit}:{genre}:{year}:{min_rating}:{sort_by}"
+    )
     
-    return result
+    async def load():
+        try:
+            films, next_cursor = await get_popular_page(
+                db,
+                popular_films_query(genre, year, min_rating),
+                sort_by=sort_by,
+                limit=limit,
+                cursor=cursor
+            )
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        return PopularFilmsPage(
+            films=[FilmResponse.model_validate(film) for film in films],
+            next_cursor=next_cursor
+        ).model_dump()
+    
+    return await cached_json_response(cache_key, load)
+
+
+@router.get("/popular/facets", response_model=FacetCountsResponse)
+async def get_popular_facets(
+    genre: Optional[str] = None,
+    year: Optional[int] = None,
+    min_rating: Optional[float] = None
+):
+    """
+    Count the popular films per genre, year and minimum rating under the
+    current filters, so the filter panel can show (and skip) empty choices.
+    """
+    facet_index = get_facet_index()
+    if facet_index is None:
+        raise HTTPException(status_code=503, detail="Facet index is loading")
+    
+    return facet_index.counts(genre, year, min_rating)
 
 
 @router.get("/search", response_model=List[FilmResponse])
 async def search_films(
     q: str = Query(..., min_length=2),
     limit: int = Query(10, ge=1, le=50),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Search films by title with autocomplete."""
+    # Answer from memory when the autocomplete index is loaded
+    title_index = get_title_index()
+    if title_index is not None:
+        return title_index.search(q, limit)
+    
     # Create cache key
     cache_key = f"search:{q}:{limit}"
     
-    # Check cache
-    cached = await get_cached(cache_key)
-    if cached:
-        return cached
+    async def load():
+        # Search in both French and original titles
+        films = await search_films_by_title(db, q, limit)
+        return [FilmResponse.model_validate(film).model_dump() for film in films]
     
-    # Search in both French and original titles
-    search_pattern = f"%{q}%"
-    films = (
-        db.query(Film)
-        .filter(
-            or_(
-                Film.titre.ilike(search_pattern),
-                Film.titre_original.ilike(search_pattern)
-            )
+    return await cached_json_response(cache_key, load, ttl=1800)  # 30 min
+
+
+def _batch_ids(ids: List[int]) -> List[int]:
+    """Deduplicated ids of a batch request, in request order."""
+    film_ids = list(dict.fromkeys(ids))
+    if len(film_ids) > settings.batch_max_ids:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.batch_max_ids} ids per request"
         )
-        .order_by(Film.popularity.desc())
-        .limit(limit)
-        .all()
-    )
-    
-    result = [FilmResponse.model_validate(film) for film in films]
-    
-    # Cache result
-    await set_cached(cache_key, [r.model_dump() for r in result], ttl=1800)  # 30 min
+    return film_ids
+
+
+@router.get("/batch", response_model=List[FilmDetailResponse])
+async def get_films_batch(
+    ids: List[int] = Query(...),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get detailed information about many films at once, in the order of
+    ``ids``. Unknown ids are skipped. Shares the cache of /films/{film_id}.
+    """
+    film_ids = _batch_ids(ids)
+    
+    async def load(missing: List[int]):
+        result = await db.execute(
+            select(Film).where(Film.id == any_(literal(missing, ARRAY(Integer))))
+        )
+        return {
+            film.id: FilmDetailResponse.model_validate(film).model_dump()
+            for film in result.scalars()
+        }
     
-    return result
+    entries = await get_or_compute_many(
+        {film_id: f"film:{film_id}" for film_id in film_ids}, load
+    )
+    return Response(
+        content=join_json_array([
+            entries[film_id].json_body for film_id in film_ids if film_id in entries
+        ]),
+        media_type="application/json"
+    )
+
+
+@router.get("/batch/similar", response_model=Dict[int, List[FilmResponse]])
+async def get_similar_films_batch(
+    ids: List[int] = Query(...),
+    limit: int = Query(2, ge=1, le=10),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get similar films for many films at once, keyed by film id.
+    Unknown ids are skipped. Shares the cache of /films/{film_id}/similar.
+    """
+    film_ids = _batch_ids(ids)
+    keys = await namespaced_keys("similarities", {
+        film_id: f"similar:{film_id}:{limit}" for film_id in film_ids
+    })
+    
+    async def load(missing: List[int]):
+        existing = (
+            await db.execute(
+                select(Film.id).where(Film.id == any_(literal(missing, ARRAY(Integer))))
+            )
+        ).scalars().all()
+        similar = await recommendation_engine.get_similar_films_batch(db, existing, limit)
+        return {
+            film_id: [FilmResponse.model_validate(film).model_dump() for film in films]
+            for film_id, films in similar.items()
+        }
+    
+    entries = await get_or_compute_many(keys, load)
+    return Response(
+        content=join_json_object({
+            film_id: entries[film_id].json_body for film_id in film_ids if film_id in entries
+        }),
+        media_type="application/json"
+    )
 
 
 @router.get("/{film_id}", response_model=FilmDetailResponse)
 async def get_film_details(
     film_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get detailed information about a film."""
-    # Check cache
     cache_key = f"film:{film_id}"
-    cached = await get_cached(cache_key)
-    if cached:
-        return cached
-    
-    film = db.query(Film).filter(Film.id == film_id).first()
-    
-    if not film:
-        raise HTTPException(status_code=404, detail="Film not found")
     
-    result = FilmDetailResponse.model_validate(film)
+    async def load():
+        film = await db.get(Film, film_id)
+        
+        if not film:
+            raise HTTPException(status_code=404, detail="Film not found")
+        
+        return FilmDetailResponse.model_validate(film).model_dump()
     
-    # Cache result
-    await set_cached(cache_key, result.model_dump())
-    
-    return result
+    return await cached_json_response(cache_key, load)
 
 
 @router.get("/{film_id}/similar", response_model=List[FilmResponse])
 async def get_similar_films(
     film_id: int,
     limit: int = Query(2, ge=1, le=10),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get similar films for a given film."""
-    # Check cache
-    cache_key = f"similar:{film_id}:{limit}"
-    cached = await get_cached(cache_key)
-    if cached:
-        return cached
-    
-    # Check if film exists
-    film = db.query(Film).filter(Film.id == film_id).first()
-    if not film:
-        raise HTTPException(status_code=404, detail="Film not found")
-    
-    # Get similar films
-    similar_films = recommendation_engine.get_similar_films(db, film_id, limit)
-    
-    result = [FilmResponse.model_validate(film) for film in similar_films]
-    
-    # Cache result
-    await set_cached(cache_key, [r.model_dump() for r in result])
-    
-    return result
+    # Invalidated whenever the similarities table is rebuilt
+    cache_key = await namespaced_key("similarities", f"similar:{film_id}:{limit}")
+    
+    async def load():
+        # Check if film exists
+        film = await db.get(Film, film_id)
+        if not film:
+            raise HTTPException(status_code=404, detail="Film not found")
+        
+        # Get similar films
+        similar_films = await recommendation_engine.get_similar_films(db, film_id, limit)
+        
+        return [FilmResponse.model_validate(film).model_dump() for film in similar_films]
+    
+    return await cached_json_response(cache_key, load)
 
 
 @router.post("/recommendations", response_model=RecommendationResponse)
 async def get_recommendations(
     request: RecommendationRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get film recommendations based on selected films and feedback."""
-    # Validate that selected films exist
-    selected_films = (
-        db.query(Film)
-        .filter(Film.id.in_(request.selected_film_ids))
-        .all()
+    liked_film_ids = request.liked_film_ids or []
+    disliked_film_ids = request.disliked_film_ids or []
+    
+    # Same id sets, same recommendations (until the similarities are rebuilt)
+    cache_key = await namespaced_key(
+        "similarities",
+        "recommendations:" + recommendation_request_key(
+            request.selected_film_ids,
+            liked_film_ids,
+            disliked_film_ids,
+            request.limit
+        )
     )
     
-    if len(selected_films) != len(request.selected_film_ids):
-        raise HTTPException(
-            status_code=400,
-            detail="One or more selected films not found"
+    async def load():
+        # Validate that selected films exist
+        selected_film_ids = set(request.selected_film_ids)
+        selected_count = (
+            await db.execute(
+                select(func.count(Film.id))
+                .where(Film.id.in_(selected_film_ids))
+            )
+        ).scalar()
+        
+        if selected_count != len(selected_film_ids):
+            raise HTTPException(
+                status_code=400,
+                detail="One or more selected films not found"
+            )
+        
+        # Get recommendations
+        recommended_films = await recommendation_engine.get_recommendations(
+            db=db,
+            selected_film_ids=request.selected_film_ids,
+            liked_film_ids=liked_film_ids,
+            disliked_film_ids=disliked_film_ids,
+            limit=request.limit
         )
+        
+        return RecommendationResponse(
+            recommendations=[FilmResponse.model_validate(film) for film in recommended_films]
+        ).model_dump()
     
-    # Get recommendations
-    recommended_films = recommendation_engine.get_recommendations(
-        db=db,
-        selected_film_ids=request.selected_film_ids,
-        liked_film_ids=request.liked_film_ids or [],
-        disliked_film_ids=request.disliked_film_ids or [],
-        limit=request.limit
+    return await cached_json_response(
+        cache_key, load, ttl=settings.recommendation_cache_ttl_seconds
     )
-    
-    result = [FilmResponse.model_validate(film) for film in recommended_films]
-    
-    return RecommendationResponse(recommendations=result)
 
 
 @router.get("/metadata/info", response_model=MetadataResponse)
-async def get_metadata(db: Session = Depends(get_db)):
-    """Get metadata for filters (genres, year range)."""
-    # Check cache
+async def get_metadata(db: AsyncSession = Depends(get_db)):
+    """Get metadata for filters (genres, year range, film counts)."""
     cache_key = "metadata:info"
-    cached = await get_cached(cache_key)
-    if cached:
-        return cached
     
-    # Get all unique genres
-    all_genres = db.query(Film.genres).all()
-    genres_set = set()
-    for (genres,) in all_genres:
-        if genres:
-            genres_set.update(genres)
-    
-    # Get year range
-    year_stats = db.query(
-        func.min(Film.annee).label('min_year'),
-        func.max(Film.annee).label('max_year')
-    ).first()
-    
-    result = MetadataResponse(
-        genres=sorted(list(genres_set)),
-        min_year=year_stats.min_year,
-        max_year=year_stats.max_year
-    )
+    async def load():
+        # Facet counts are maintained on ingest: O(#genres + #years)
+        counts = await get_facet_counts(db)
+        genre_counts = counts[GENRE]
+        year_counts = {int(year): count for year, count in counts[YEAR].items()}
+        
+        return MetadataResponse(
+            genres=sorted(genre_counts),
+            min_year=min(year_counts, default=None),
+            max_year=max(year_counts, default=None),
+            genre_counts=genre_counts,
+            year_counts=dict(sorted(year_counts.items()))
+        ).model_dump(mode="json")  # Year keys become strings
     
     # Cache for longer (metadata changes rarely)
-    await set_cached(cache_key, result.model_dump(), ttl=7200)  # 2 hours
-    
-    return result
+    return await cached_json_response(cache_key, load, ttl=7200)  # 2 hours
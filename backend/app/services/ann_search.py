@@ -0,0 +1,165 @@
+import numpy as np
+from scipy import sparse
+from sklearn.decomposition import TruncatedSVD
+from sklearn.preprocessing import normalize
+from typing import Iterator, Optional, Tuple
+
+# Bytes needed per candidate pair and stored TF-IDF term while a block is
+# scored: both gathered sparse rows and their product (value + index each).
+_BYTES_PER_PAIR_TERM = 36
+
+# Average bucket size targeted when the number of hash bits is automatic
+_TARGET_BUCKET_SIZE = 64
+
+
+def reduce_dimensions(matrix: sparse.spmatrix, n_components: int, seed: int = 0) -> np.ndarray:
+    """Dense, L2-normalized float32 embeddings of the rows of a sparse matrix."""
+    n_components = max(1, min(n_components, matrix.shape[1] - 1))
+    if matrix.shape[1] <= 1:
+        embeddings = sparse.csr_matrix(matrix).toarray()
+    else:
+        svd = TruncatedSVD(n_components=n_components, algorithm="randomized", random_state=seed)
+        embeddings = svd.fit_transform(matrix)
+    return normalize(embeddings).astype(np.float32)
+
+
+def _top_per_row(rows: np.ndarray, scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k best scores of every row, grouped by row and sorted descending."""
+    if len(rows) == 0:
+        return np.empty(0, dtype=np.int64)
+    order = np.lexsort((-scores, rows))
+    rows = rows[order]
+    group_starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+    ranks = np.arange(len(rows)) - np.repeat(group_starts, np.diff(np.r_[group_starts, len(rows)]))
+    return order[ranks < k]
+
+
+def auto_bits(n_rows: int) -> int:
+    """Number of hash bits giving buckets of about _TARGET_BUCKET_SIZE films."""
+    return int(np.clip(round(np.log2(max(n_rows, 1) / _TARGET_BUCKET_SIZE)), 1, 62))
+
+
+class LSHIndex:
+    """
+    Approximate cosine nearest neighbours by random-projection LSH.
+
+    Rows of the TF-IDF matrix are reduced to dense embeddings (TruncatedSVD)
+    and hashed in ``n_tables`` tables, each keyed by the signs of ``n_bits``
+    random projections (automatic when ``n_bits`` is 0), so similar films
+    tend to share a bucket. Films
+    sharing a bucket with a query in any table are its candidates, scored
+    exactly on the TF-IDF vectors. Building and querying are linear in the
+    catalog size.
+    """
+
+    def __init__(
+        self,
+        matrix: sparse.spmatrix,
+        embeddings: np.ndarray,
+        n_tables: int,
+        n_bits: int,
+        seed: int = 0
+    ):
+        self.matrix = normalize(sparse.csr_matrix(matrix))
+        self.embeddings = embeddings
+        self.n_bits = n_bits or auto_bits(len(embeddings))
+
+        rng = np.random.default_rng(seed)
+        planes = rng.standard_normal(
+            (n_tables, embeddings.shape[1], self.n_bits)
+        ).astype(np.float32)
+        bit_values = np.left_shift(1, np.arange(self.n_bits, dtype=np.int64))
+
+        self.codes = np.empty((n_tables, len(embeddings)), dtype=np.int64)
+        self.sorted_codes = np.empty_like(self.codes)
+        self.sorted_rows = np.empty_like(self.codes)
+        for table in range(n_tables):
+            codes = (embeddings @ planes[table] > 0) @ bit_values
+            order = np.argsort(codes, kind="stable")
+            self.codes[table] = codes
+            self.sorted_codes[table] = codes[order]
+            self.sorted_rows[table] = order
+
+    @classmethod
+    def build(
+        cls,
+        matrix: sparse.spmatrix,
+        n_components: int = 64,
+        n_tables: int = 16,
+        n_bits: int = 0,
+        seed: int = 0
+    ) -> "LSHIndex":
+        """Reduce the matrix and hash its rows."""
+        return cls(
+            matrix,
+            reduce_dimensions(matrix, n_components, seed),
+            n_tables=n_tables,
+            n_bits=n_bits,
+            seed=seed
+        )
+
+    def candidates(self, positions: np.ndarray, max_bucket: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (query, row) candidate pairs of the films at ``positions``: films
+        sharing a bucket in any table, at most ``max_bucket`` per bucket,
+        deduplicated and without the query itself. ``query`` indexes
+        ``positions``.
+        """
+        queries, rows = [], []
+        for table in range(len(self.codes)):
+            codes = self.codes[table, positions]
+            starts = np.searchsorted(self.sorted_codes[table], codes, side="left")
+            ends = np.searchsorted(self.sorted_codes[table], codes, side="right")
+            sizes = np.minimum(ends - starts, max_bucket)
+
+            query = np.repeat(np.arange(len(positions)), sizes)
+            offsets = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+            queries.append(query)
+            rows.append(self.sorted_rows[table][np.repeat(starts, sizes) + offsets])
+
+        n_rows = len(self.embeddings)
+        pairs = np.sort(np.concatenate(queries) * n_rows + np.concatenate(rows))
+        pairs = pairs[np.r_[True, pairs[1:] != pairs[:-1]]] if len(pairs) else pairs
+        queries, rows = pairs // n_rows, pairs % n_rows
+        keep = rows != positions[queries]
+        return queries[keep], rows[keep]
+
+    def iter_top_k(
+        self,
+        top_n: int,
+        positions: Optional[np.ndarray] = None,
+        max_bucket: int = 1000,
+        memory_budget_mb: int = 512
+    ) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+        """
+        Yield the approximate top-N cosine neighbours of the films at
+        ``positions`` (default: all), like similarity_search.iter_top_k
+        with ``self_indices=positions``: ``(i, corpus_indices, scores)``
+        with exact scores sorted descending. Films may get fewer than N
+        neighbours when their buckets are small.
+        """
+        if positions is None:
+            positions = np.arange(len(self.embeddings))
+        positions = np.asarray(positions, dtype=np.int64)
+
+        # Query rows per block, from the worst-case number of candidates
+        max_candidates = max(1, len(self.codes) * max_bucket)
+        terms_per_row = max(1, self.matrix.nnz // max(self.matrix.shape[0], 1))
+        budget_bytes = max(memory_budget_mb, 1) * 1024 * 1024
+        block_rows = max(1, budget_bytes // (
+            _BYTES_PER_PAIR_TERM * terms_per_row * max_candidates
+        ))
+
+        for start in range(0, len(positions), block_rows):
+            block = positions[start:start + block_rows]
+            queries, rows = self.candidates(block, max_bucket)
+            scores = np.asarray(
+                self.matrix[block[queries]].multiply(self.matrix[rows]).sum(axis=1)
+            ).ravel()
+
+            best = _top_per_row(queries, scores, top_n)
+            queries, rows, scores = queries[best], rows[best], scores[best]
+            bounds = np.searchsorted(queries, np.arange(len(block) + 1))
+            for offset in range(len(block)):
+                begin, end = bounds[offset], bounds[offset + 1]
+                yield start + offset, rows[begin:end], scores[begin:end]
@@ -0,0 +1,84 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Tuple
+from app.services.neighbour_index import NeighbourIndex
+
+# (selected_film_ids, liked_film_ids, disliked_film_ids)
+Profile = Tuple[List[int], List[int], List[int]]
+
+# Index shared by the chunks scored in a worker process
+_worker_index: Optional[NeighbourIndex] = None
+
+
+def _init_worker(index: NeighbourIndex) -> None:
+    global _worker_index
+    _worker_index = index
+
+
+def _recommend_chunk(
+    chunk: List[Tuple[List[int], List[int]]],
+    limit: int
+) -> List[List[int]]:
+    return _worker_index.recommend_batch(chunk, limit)
+
+
+def _iter_chunks(
+    profiles: Iterable[Profile],
+    chunk_size: int
+) -> Iterator[List[Tuple[List[int], List[int]]]]:
+    """(positive, disliked) chunks of the profiles, read lazily."""
+    profiles = iter(profiles)
+    while True:
+        chunk = [
+            (list(selected) + list(liked or []), list(disliked or []))
+            for selected, liked, disliked in islice(profiles, chunk_size)
+        ]
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_batch_recommendations(
+    index: NeighbourIndex,
+    profiles: Iterable[Profile],
+    limit: int = 10,
+    workers: int = 1,
+    chunk_size: int = 1000
+) -> Iterator[List[int]]:
+    """
+    Yield the recommended film ids of every profile, in input order.
+
+    Profiles are scored ``chunk_size`` at a time with
+    NeighbourIndex.recommend_batch. With several ``workers`` the chunks are
+    spread over a process pool (the index is sent once per worker) and at
+    most two chunks per worker are in flight, so results stream out while
+    the profiles are still being read.
+    """
+    chunks = _iter_chunks(profiles, chunk_size)
+
+    if workers <= 1:
+        for chunk in chunks:
+            yield from index.recommend_batch(chunk, limit)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(index,)
+    ) as pool:
+        pending = deque(
+            pool.submit(_recommend_chunk, chunk, limit)
+            for chunk in islice(chunks, workers * 2)
+        )
+        while pending:
+            results = pending.popleft().result()
+            for chunk in islice(chunks, 1):
+                pending.append(pool.submit(_recommend_chunk, chunk, limit))
+            yield from results
+
+
+def default_workers(workers: int) -> int:
+    """Configured worker count, where 0 means one per CPU."""
+    return workers if workers > 0 else (os.cpu_count() or 1)
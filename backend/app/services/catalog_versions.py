@@ -0,0 +1,36 @@
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.models.catalog import CatalogVersion
+
+# Dataset names
+FILMS = "films"
+SIMILARITIES = "similarities"
+
+
+def get_version(db: Session, name: str) -> int:
+    """Get the current version of a dataset (0 if never bumped)."""
+    version = db.execute(
+        select(CatalogVersion.version).where(CatalogVersion.name == name)
+    ).scalar()
+    return version or 0
+
+
+def bump_version(db: Session, name: str) -> int:
+    """
+    Increment the version of a dataset and return the new value.
+    Runs in the caller's transaction so the bump commits with the data change.
+    """
+    statement = (
+        insert(CatalogVersion)
+        .values(name=name, version=1)
+        .on_conflict_do_update(
+            index_elements=[CatalogVersion.name],
+            set_={
+                "version": CatalogVersion.version + 1,
+                "updated_at": func.now()
+            }
+        )
+        .returning(CatalogVersion.version)
+    )
+    return db.execute(statement).scalar()
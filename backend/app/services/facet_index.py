@@ -0,0 +1,127 @@
+from typing import Dict, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.models.film import Film
+from app.services.catalog_versions import FILMS, get_version
+
+# min_rating values counted by the rating facet
+RATING_THRESHOLDS = list(range(1, 10))
+
+# Number of set bits of every byte value
+_POPCOUNT = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint16)
+
+
+def _bitset(mask: np.ndarray) -> np.ndarray:
+    return np.packbits(mask)
+
+
+def _count(bits: np.ndarray) -> int:
+    return int(_POPCOUNT[bits].sum())
+
+
+class FacetIndex:
+    """
+    Read-only, in-memory bitsets of the browsable catalog.
+
+    Every genre, year and rating threshold has a packed bitset over the
+    browsable films, so counting the films matching any combination of
+    /films/popular filters is a few bitwise ANDs and popcounts.
+    """
+
+    def __init__(
+        self,
+        genres: Dict[str, np.ndarray],
+        years: Dict[int, np.ndarray],
+        vote_average: np.ndarray,
+        version: int
+    ):
+        self.genres = genres
+        self.years = years
+        self.vote_average = vote_average
+        self.version = version
+
+        self.size = len(vote_average)
+        self.all = _bitset(np.ones(self.size, dtype=bool))
+        self.none = np.zeros_like(self.all)
+        self.ratings = {
+            threshold: _bitset(vote_average >= threshold)
+            for threshold in RATING_THRESHOLDS
+        }
+
+    @classmethod
+    def load(cls, db: Session) -> "FacetIndex":
+        """Build the index from the browsable films."""
+        version = get_version(db, FILMS)
+
+        rows = db.execute(
+            select(Film.genres, Film.annee, Film.vote_average).where(Film.is_browsable)
+        ).all()
+        return cls.from_rows(rows, version)
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Tuple], version: int) -> "FacetIndex":
+        """Build the index from (genres, annee, vote_average) rows."""
+        genre_masks: Dict[str, np.ndarray] = {}
+        year_masks: Dict[int, np.ndarray] = {}
+        vote_average = np.zeros(len(rows), dtype=np.float32)
+        for position, (genres, annee, rating) in enumerate(rows):
+            for genre in genres or []:
+                if genre not in genre_masks:
+                    genre_masks[genre] = np.zeros(len(rows), dtype=bool)
+                genre_masks[genre][position] = True
+            if annee is not None:
+                if annee not in year_masks:
+                    year_masks[annee] = np.zeros(len(rows), dtype=bool)
+                year_masks[annee][position] = True
+            vote_average[position] = rating or 0.0
+
+        return cls(
+            genres={genre: _bitset(mask) for genre, mask in sorted(genre_masks.items())},
+            years={year: _bitset(mask) for year, mask in sorted(year_masks.items())},
+            vote_average=vote_average,
+            version=version
+        )
+
+    def _rating_bits(self, min_rating: float) -> np.ndarray:
+        if min_rating in self.ratings:
+            return self.ratings[min_rating]
+        return _bitset(self.vote_average >= min_rating)
+
+    def counts(
+        self,
+        genre: Optional[str] = None,
+        year: Optional[int] = None,
+        min_rating: Optional[float] = None
+    ) -> Dict[str, object]:
+        """
+        Number of films per genre, year and rating threshold under the
+        given filters (same semantics as /films/popular). Each facet is
+        counted with the filters of the other facets only, so it shows
+        what changing that filter would return.
+        """
+        filters: Dict[str, np.ndarray] = {}
+        if genre:
+            filters["genre"] = self.genres.get(genre, self.none)
+        if year:
+            filters["year"] = self.years.get(year, self.none)
+        if min_rating:
+            filters["rating"] = self._rating_bits(min_rating)
+
+        def combined(excluded: str = None) -> np.ndarray:
+            bits = self.all
+            for name, facet_bits in filters.items():
+                if name != excluded:
+                    bits = bits & facet_bits
+            return bits
+
+        def facet_counts(bitsets: Dict, excluded: str) -> Dict:
+            base = combined(excluded)
+            return {value: _count(base & bits) for value, bits in bitsets.items()}
+
+        return {
+            "total": _count(combined()),
+            "genres": facet_counts(self.genres, "genre"),
+            "years": facet_counts(self.years, "year"),
+            "ratings": facet_counts(self.ratings, "rating"),
+        }
@@ -0,0 +1,128 @@
+import json
+import os
+import numpy as np
+from pathlib import Path
+from scipy import sparse
+from typing import Dict, List, Mapping, Tuple
+from app.services.film_features import FIELDS, FilmFeaturizer, is_fitted
+
+# Bumped when the on-disk layout changes; older stores read as missing
+FORMAT_VERSION = 2
+
+
+class FeatureStore:
+    """
+    On-disk TF-IDF state used for incremental and reweighted similarity updates.
+
+    Holds, per field, the fitted vocabulary and IDF weights and the
+    unweighted block of per-film vectors (one row per film, ordered like
+    ``film_ids``), a fingerprint of each film's features so that changed
+    films can be detected without a refit, and the field weights the
+    stored similarities were computed with.
+
+    Blocks are saved as raw CSR arrays (``{field}.data.npy`` etc.) and
+    memory-mapped at load. Every file is written to a temporary name and
+    renamed, and the manifest is written last, so readers (including
+    mapped arrays of the previous store) never see a partial store.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+
+    def exists(self) -> bool:
+        """Check whether a complete store of the current format has been saved."""
+        try:
+            with open(self.path / "manifest.json", encoding="utf-8") as f:
+                return json.load(f).get("format") == FORMAT_VERSION
+        except (OSError, ValueError):
+            return False
+
+    def _save_array(self, name: str, array: np.ndarray) -> None:
+        temporary = self.path / f"{name}.tmp"
+        with open(temporary, "wb") as f:
+            np.save(f, array)
+        os.replace(temporary, self.path / name)
+
+    def _save_json(self, name: str, value) -> None:
+        temporary = self.path / f"{name}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(temporary, self.path / name)
+
+    def save(
+        self,
+        featurizer: FilmFeaturizer,
+        blocks: Mapping[str, sparse.spmatrix],
+        film_ids: List[int],
+        feature_hashes: List[int],
+        weights: Mapping[str, float]
+    ) -> None:
+        """Persist the fitted vectorizers, per-film field blocks and weights."""
+        self.path.mkdir(parents=True, exist_ok=True)
+        (self.path / "manifest.json").unlink(missing_ok=True)
+
+        shapes = {}
+        for field in FIELDS:
+            vectorizer = featurizer.vectorizers[field]
+            fitted = is_fitted(vectorizer)
+            vocabulary = (
+                {term: int(index) for term, index in vectorizer.vocabulary_.items()}
+                if fitted else {}
+            )
+            self._save_json(f"{field}.vocabulary.json", vocabulary)
+            self._save_array(
+                f"{field}.idf.npy", vectorizer.idf_ if fitted else np.empty(0)
+            )
+
+            block = sparse.csr_matrix(blocks[field])
+            block.sort_indices()
+            self._save_array(f"{field}.data.npy", block.data.astype(np.float32))
+            self._save_array(f"{field}.indices.npy", block.indices)
+            self._save_array(f"{field}.indptr.npy", block.indptr)
+            shapes[field] = list(block.shape)
+
+        self._save_array("film_ids.npy", np.asarray(film_ids, dtype=np.int64))
+        self._save_array("feature_hashes.npy", np.asarray(feature_hashes, dtype=np.uint64))
+
+        self._save_json("manifest.json", {
+            "format": FORMAT_VERSION,
+            "shapes": shapes,
+            "weights": {field: float(weights.get(field, 0.0)) for field in FIELDS},
+        })
+
+    def load(
+        self,
+        featurizer: FilmFeaturizer
+    ) -> Tuple[Dict[str, sparse.csr_matrix], np.ndarray, Dict[int, int], Dict[str, float]]:
+        """
+        Restore the vocabularies and IDF weights into ``featurizer``.
+        Returns (blocks, film_ids, {film_id: feature_hash}, weights);
+        blocks and film ids are read-only memory-mapped arrays.
+        """
+        with open(self.path / "manifest.json", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        blocks = {}
+        for field in FIELDS:
+            with open(self.path / f"{field}.vocabulary.json", encoding="utf-8") as f:
+                vocabulary = json.load(f)
+            if vocabulary:
+                vectorizer = featurizer.vectorizers[field]
+                vectorizer.vocabulary_ = vocabulary
+                vectorizer.idf_ = np.load(self.path / f"{field}.idf.npy")
+
+            blocks[field] = sparse.csr_matrix(
+                (
+                    np.load(self.path / f"{field}.data.npy", mmap_mode="r"),
+                    np.load(self.path / f"{field}.indices.npy", mmap_mode="r"),
+                    np.load(self.path / f"{field}.indptr.npy", mmap_mode="r"),
+                ),
+                shape=tuple(manifest["shapes"][field]),
+                copy=False
+            )
+
+        film_ids = np.load(self.path / "film_ids.npy", mmap_mode="r")
+        feature_hashes = np.load(self.path / "feature_hashes.npy", mmap_mode="r")
+        hashes = dict(zip(film_ids.tolist(), feature_hashes.tolist()))
+
+        return blocks, film_ids, hashes, manifest["weights"]
@@ -0,0 +1,105 @@
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+from sqlalchemy import String, cast, delete, func, literal, select, union_all
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.models.catalog import FilmFacet
+from app.models.film import Film
+
+# Facet names
+GENRE = "genre"
+YEAR = "year"
+
+
+def _facet_values(genres: Optional[List[str]], annee: Optional[int]) -> List[tuple]:
+    """(facet, value) pairs a film counts towards."""
+    values = [(GENRE, genre) for genre in set(genres or []) if genre]
+    if annee is not None:
+        values.append((YEAR, str(annee)))
+    return values
+
+
+def lock_facet_sources(db: Session, tmdb_ids: Iterable[int]) -> Dict[int, tuple]:
+    """
+    Current (genres, annee) of the given films, locked until commit so
+    concurrent ingests cannot apply deltas from the same old values.
+    """
+    rows = db.execute(
+        select(Film.tmdb_id, Film.genres, Film.annee)
+        .where(Film.tmdb_id.in_(list(tmdb_ids)))
+        .with_for_update()
+    ).all()
+    return {tmdb_id: (genres, annee) for tmdb_id, genres, annee in rows}
+
+
+def update_facets(
+    db: Session,
+    previous: Dict[int, tuple],
+    films: List[Dict[str, Any]]
+) -> None:
+    """
+    Apply the facet count changes of upserting ``films`` over their
+    ``previous`` (genres, annee). Runs in the caller's transaction.
+    """
+    deltas = Counter()
+    for film in films:
+        if film["tmdb_id"] in previous:
+            deltas.subtract(_facet_values(*previous[film["tmdb_id"]]))
+        deltas.update(_facet_values(film.get("genres"), film.get("annee")))
+    
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    
+    statement = insert(FilmFacet).values([
+        {"facet": facet, "value": value, "film_count": delta}
+        for (facet, value), delta in deltas.items()
+    ])
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[FilmFacet.facet, FilmFacet.value],
+        set_={"film_count": FilmFacet.film_count + statement.excluded.film_count}
+    ))
+    db.execute(delete(FilmFacet).where(FilmFacet.film_count <= 0))
+
+
+def rebuild_facets(db: Session) -> None:
+    """Recompute all facet counts from the films table (e.g. after an upgrade)."""
+    # Distinct (genre, film) pairs, so duplicated genres count once
+    film_genres = (
+        select(
+            literal(GENRE).label("facet"),
+            func.unnest(Film.genres).label("value"),
+            Film.id.label("film_id")
+        )
+        .distinct()
+        .subquery()
+    )
+    db.execute(delete(FilmFacet))
+    db.execute(insert(FilmFacet).from_select(
+        ["facet", "value", "film_count"],
+        union_all(
+            select(film_genres.c.facet, film_genres.c.value, func.count())
+            .group_by(film_genres.c.facet, film_genres.c.value),
+            select(literal(YEAR), cast(Film.annee, String), func.count())
+            .where(Film.annee.isnot(None))
+            .group_by(Film.annee)
+        )
+    ))
+    db.commit()
+
+
+def facets_missing(db: Session) -> bool:
+    """True if films exist but no facet counts were ever recorded."""
+    has_films = db.execute(select(Film.id).limit(1)).first() is not None
+    has_facets = db.execute(select(FilmFacet.facet).limit(1)).first() is not None
+    return has_films and not has_facets
+
+
+async def get_facet_counts(db: AsyncSession) -> Dict[str, Dict[str, int]]:
+    """Film counts per value of every facet."""
+    result = await db.execute(select(FilmFacet.facet, FilmFacet.value, FilmFacet.film_count))
+    counts: Dict[str, Dict[str, int]] = {GENRE: {}, YEAR: {}}
+    for facet, value, film_count in result.all():
+        counts.setdefault(facet, {})[value] = film_count
+    return counts
@@ -0,0 +1,118 @@
+import hashlib
+import json
+from typing import Dict, List, Mapping, Sequence
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+# Film fields, each vectorized into its own TF-IDF block
+GENRES = "genres"
+KEYWORDS = "keywords"
+CAST = "cast"
+DIRECTOR = "director"
+TITLE = "title"
+OVERVIEW = "overview"
+FIELDS = (GENRES, KEYWORDS, CAST, DIRECTOR, TITLE, OVERVIEW)
+
+# Fields whose values (e.g. a full actor name) are single terms
+TAG_FIELDS = (GENRES, KEYWORDS, CAST, DIRECTOR)
+
+
+def _tags(values) -> List[str]:
+    return [value.strip().lower() for value in values or [] if value and value.strip()]
+
+
+def film_documents(film) -> Dict[str, object]:
+    """
+    Per-field documents of a film row: a list of terms for tag fields,
+    lowercased text for the others.
+    """
+    return {
+        GENRES: _tags(film.genres),
+        KEYWORDS: _tags(film.keywords),
+        CAST: _tags(film.actors),
+        DIRECTOR: _tags([film.director]),
+        TITLE: (film.titre or "").lower(),
+        OVERVIEW: (film.overview or "").lower(),
+    }
+
+
+def feature_hash(documents: Mapping[str, object]) -> int:
+    """Stable 64-bit fingerprint of a film's field documents."""
+    canonical = json.dumps(documents, sort_keys=True, ensure_ascii=False)
+    digest = hashlib.blake2b(canonical.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def _terms(terms: List[str]) -> List[str]:
+    return terms
+
+
+def make_vectorizer(field: str) -> TfidfVectorizer:
+    """Create the TF-IDF vectorizer of a field (rows are L2-normalized)."""
+    if field in TAG_FIELDS:
+        return TfidfVectorizer(analyzer=_terms)
+    if field == OVERVIEW:
+        return TfidfVectorizer(
+            max_features=5000,
+            stop_words='english',
+            ngram_range=(1, 2),
+            sublinear_tf=True
+        )
+    return TfidfVectorizer()
+
+
+def is_fitted(vectorizer: TfidfVectorizer) -> bool:
+    """Check whether a vectorizer has a (non-empty) vocabulary."""
+    return bool(getattr(vectorizer, "vocabulary_", None))
+
+
+class FilmFeaturizer:
+    """
+    TF-IDF vectorizers of the film fields.
+
+    Every field is vectorized into its own block of L2-normalized rows, so
+    fields are weighted when the blocks are combined (see combine_blocks)
+    instead of by repeating their terms, and blocks can be reweighted
+    without re-tokenizing the catalog.
+    """
+
+    def __init__(self):
+        self.vectorizers = {field: make_vectorizer(field) for field in FIELDS}
+
+    def fit_transform(self, documents: Sequence[Mapping[str, object]]) -> Dict[str, sparse.csr_matrix]:
+        """Fit every field on the given films and return their blocks."""
+        blocks = {}
+        for field, vectorizer in self.vectorizers.items():
+            try:
+                blocks[field] = vectorizer.fit_transform([doc[field] for doc in documents])
+            except ValueError:
+                # No film has terms for this field
+                self.vectorizers[field] = make_vectorizer(field)
+                blocks[field] = sparse.csr_matrix((len(documents), 0))
+        return blocks
+
+    def transform(self, documents: Sequence[Mapping[str, object]]) -> Dict[str, sparse.csr_matrix]:
+        """Blocks of the given films with the fitted vocabularies."""
+        blocks = {}
+        for field, vectorizer in self.vectorizers.items():
+            if is_fitted(vectorizer) and documents:
+                blocks[field] = vectorizer.transform([doc[field] for doc in documents])
+            else:
+                width = len(vectorizer.vocabulary_) if is_fitted(vectorizer) else 0
+                blocks[field] = sparse.csr_matrix((len(documents), width))
+        return blocks
+
+
+def combine_blocks(
+    blocks: Mapping[str, sparse.spmatrix],
+    weights: Mapping[str, float]
+) -> sparse.csr_matrix:
+    """
+    Film vectors made of the weighted field blocks side by side.
+    With L2-normalized blocks, the cosine of two films having every
+    field is the weight²-weighted average of their per-field cosines.
+    """
+    return sparse.hstack(
+        [blocks[field] * weights.get(field, 0.0) for field in FIELDS],
+        format="csr"
+    )
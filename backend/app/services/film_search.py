@@ -0,0 +1,103 @@
+from typing import List, Optional
+from sqlalchemy import and_, case, func, literal, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.core.config import get_settings
+from app.models.film import Film, search_key
+from app.services.catalog_versions import FILMS, get_version
+from app.services.title_index import TitleIndex
+
+settings = get_settings()
+
+# In-memory autocomplete index, loaded when title_index_enabled is set
+_title_index: Optional[TitleIndex] = None
+
+# Largest code point: upper bound of every string sharing a prefix
+_MAX_CHAR = chr(0x10FFFF)
+
+
+def _escape_like(value: str) -> str:
+    """Escape LIKE wildcards in user input."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _prefix_match(column, query: str):
+    """Folded title starts with the folded query (btree range on the C-collated key)."""
+    key = search_key(column).collate("C")
+    lower_bound = search_key(literal(query))
+    upper_bound = lower_bound.op("||")(_MAX_CHAR)
+    return and_(key >= lower_bound.collate("C"), key <= upper_bound.collate("C"))
+
+
+def get_title_index() -> Optional[TitleIndex]:
+    """The loaded autocomplete index, if any."""
+    return _title_index
+
+
+def refresh_title_index(db: Session) -> bool:
+    """
+    Load the in-memory autocomplete index, or reload it if the films
+    table changed since it was loaded. Returns True if (re)loaded.
+    """
+    global _title_index
+    if _title_index is not None and _title_index.version == get_version(db, FILMS):
+        return False
+    
+    _title_index = TitleIndex.load(db)
+    return True
+
+
+async def search_films_by_title(db: AsyncSession, q: str, limit: int) -> List[Film]:
+    """
+    Search films by French or original title, accent- and case-insensitively.
+    
+    Short queries use a prefix range scan ordered by popularity. Longer
+    queries use the trigram indexes for substring matching and rank by a
+    blend of title similarity, prefix match and popularity.
+    """
+    q = q.strip()
+    
+    if len(q) <= settings.search_prefix_max_length:
+        query = (
+            select(Film)
+            .where(or_(
+                _prefix_match(Film.titre, q),
+                _prefix_match(Film.titre_original, q)
+            ))
+            .order_by(Film.popularity.desc())
+            .limit(limit)
+        )
+        return (await db.execute(query)).scalars().all()
+    
+    folded_query = search_key(literal(q))
+    pattern = search_key(literal(f"%{_escape_like(q)}%"))
+    prefix_pattern = search_key(literal(f"{_escape_like(q)}%"))
+    
+    title_similarity = func.greatest(
+        func.similarity(search_key(Film.titre), folded_query),
+        func.coalesce(func.similarity(search_key(Film.titre_original), folded_query), 0)
+    )
+    prefix_boost = case(
+        (or_(
+            search_key(Film.titre).like(prefix_pattern),
+            search_key(Film.titre_original).like(prefix_pattern)
+        ), settings.search_prefix_boost),
+        else_=0.0
+    )
+    popularity_score = func.ln(1 + func.greatest(func.coalesce(Film.popularity, 0), 0))
+    rank = (
+        title_similarity * settings.search_similarity_weight
+        + prefix_boost
+        + popularity_score * settings.search_popularity_weight
+    )
+    
+    query = (
+        select(Film)
+        .where(or_(
+            search_key(Film.titre).like(pattern),
+            search_key(Film.titre_original).like(pattern)
+        ))
+        .order_by(rank.desc(), Film.popularity.desc())
+        .limit(limit)
+    )
+    return (await db.execute(query)).scalars().all()
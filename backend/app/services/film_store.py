@@ -0,0 +1,48 @@
+from typing import Any, Dict, List, Tuple
+from sqlalchemy import func, literal_column
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.models.film import Film
+from app.services.catalog_versions import FILMS, bump_version
+from app.services.film_facets import lock_facet_sources, update_facets
+from app.services.popular_films import refresh_browsable_films
+
+
+def upsert_films(db: Session, films: List[Dict[str, Any]]) -> Tuple[int, int]:
+    """
+    Insert or update a batch of normalized film dicts in one statement,
+    using INSERT ... ON CONFLICT (tmdb_id) DO UPDATE.
+    Updates the facet counts and the popular-listing flag of the batch and
+    bumps the films catalog version in the same transaction.
+    Returns (films_added, films_updated).
+    """
+    # A row cannot be touched twice by the same ON CONFLICT statement
+    rows = list({film["tmdb_id"]: film for film in films}.values())
+    if not rows:
+        return 0, 0
+    
+    statement = insert(Film).values(rows)
+    update_columns = {
+        column: statement.excluded[column]
+        for column in rows[0]
+        if column != "tmdb_id"  # Don't update tmdb_id
+    }
+    update_columns["updated_at"] = func.now()
+    
+    statement = statement.on_conflict_do_update(
+        index_elements=[Film.tmdb_id],
+        set_=update_columns
+    ).returning(literal_column("(xmax = 0)"))  # True for inserted rows
+    
+    try:
+        previous = lock_facet_sources(db, [row["tmdb_id"] for row in rows])
+        inserted = sum(1 for (is_insert,) in db.execute(statement) if is_insert)
+        update_facets(db, previous, rows)
+        refresh_browsable_films(db, [row["tmdb_id"] for row in rows])
+        bump_version(db, FILMS)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    
+    return inserted, len(rows) - inserted
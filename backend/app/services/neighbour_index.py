@@ -0,0 +1,277 @@
+import copy
+import numpy as np
+from itertools import chain
+from scipy import sparse
+from typing import List, Sequence, Tuple
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.models.film import Film, Similarity
+from app.services.catalog_versions import FILMS, SIMILARITIES, get_version
+
+# Similarity rows converted to arrays at a time while loading
+_EDGE_CHUNK_ROWS = 100_000
+
+
+class NeighbourIndex:
+    """
+    Read-only, in-memory copy of the similarities table.
+
+    Neighbour lists are stored CSR-style: the neighbours of the film at
+    position ``p`` in ``film_ids`` are ``neighbours[offsets[p]:offsets[p + 1]]``
+    (positions, sorted by descending score) with matching ``scores``.
+    ``version`` and ``films_version`` are the catalog versions of the
+    similarities and of the films (ratings) it was loaded from.
+    """
+
+    def __init__(
+        self,
+        film_ids: np.ndarray,
+        offsets: np.ndarray,
+        neighbours: np.ndarray,
+        scores: np.ndarray,
+        vote_average: np.ndarray,
+        version: int,
+        films_version: int = 0
+    ):
+        self.film_ids = film_ids
+        self.offsets = offsets
+        self.neighbours = neighbours
+        self.scores = scores
+        self.vote_average = vote_average
+        self.version = version
+        self.films_version = films_version
+
+        # The neighbour lists already are a CSR (films x films) score matrix
+        n_films = len(film_ids)
+        self.graph = sparse.csr_matrix((scores, neighbours, offsets), shape=(n_films, n_films))
+        self.reach = self.graph.astype(bool)
+
+    @staticmethod
+    def _read_ratings(db: Session) -> Tuple[np.ndarray, np.ndarray]:
+        """(film_ids, vote_average) of every film, ordered by id."""
+        films = db.execute(
+            select(Film.id, Film.vote_average).order_by(Film.id)
+        ).all()
+        film_ids = np.fromiter((row[0] for row in films), dtype=np.int32, count=len(films))
+        vote_average = np.fromiter(
+            (row[1] or 0.0 for row in films), dtype=np.float32, count=len(films)
+        )
+        return film_ids, vote_average
+
+    @staticmethod
+    def _read_edges(db: Session) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        (sources, targets, scores) of every similarity, by source film then
+        descending score. Rows are streamed and converted to arrays chunk by
+        chunk, so a full table is never held as Python row objects.
+        """
+        result = db.execute(
+            select(Similarity.film_id, Similarity.similar_film_id, Similarity.score)
+            .order_by(Similarity.film_id, Similarity.score.desc())
+            .execution_options(yield_per=_EDGE_CHUNK_ROWS)
+        )
+        chunks = []
+        for rows in result.partitions():
+            sources, targets, scores = zip(*rows)
+            chunks.append((
+                np.array(sources, dtype=np.int32),
+                np.array(targets, dtype=np.int32),
+                np.array(scores, dtype=np.float32),
+            ))
+        if not chunks:
+            return (
+                np.empty(0, dtype=np.int32),
+                np.empty(0, dtype=np.int32),
+                np.empty(0, dtype=np.float32),
+            )
+        return tuple(np.concatenate(column) for column in zip(*chunks))
+
+    @classmethod
+    def load(cls, db: Session) -> "NeighbourIndex":
+        """Build the index from the films and similarities tables."""
+        version = get_version(db, SIMILARITIES)
+        films_version = get_version(db, FILMS)
+
+        film_ids, vote_average = cls._read_ratings(db)
+        sources, targets, scores = cls._read_edges(db)
+
+        source_positions = np.searchsorted(film_ids, sources)
+        offsets = np.zeros(len(film_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(source_positions, minlength=len(film_ids)), out=offsets[1:])
+
+        return cls(
+            film_ids=film_ids,
+            offsets=offsets,
+            neighbours=np.searchsorted(film_ids, targets).astype(np.int32),
+            scores=scores,
+            vote_average=vote_average,
+            version=version,
+            films_version=films_version
+        )
+
+    def with_ratings(
+        self,
+        film_ids: np.ndarray,
+        vote_average: np.ndarray,
+        films_version: int
+    ) -> "NeighbourIndex":
+        """
+        Copy of the index with updated ratings (``film_ids`` sorted), sharing
+        the neighbour lists. Films missing from ``film_ids`` keep their rating.
+        """
+        updated = copy.copy(self)
+        updated.vote_average = self.vote_average.copy()
+        if len(film_ids):
+            positions = np.minimum(np.searchsorted(film_ids, self.film_ids), len(film_ids) - 1)
+            known = film_ids[positions] == self.film_ids
+            updated.vote_average[known] = vote_average[positions[known]]
+        updated.films_version = films_version
+        return updated
+
+    def refresh_ratings(self, db: Session) -> "NeighbourIndex":
+        """Copy of the index with the current ratings of the films table."""
+        films_version = get_version(db, FILMS)
+        return self.with_ratings(*self._read_ratings(db), films_version)
+
+    def __len__(self) -> int:
+        return len(self.film_ids)
+
+    def _positions(self, film_ids: List[int]) -> np.ndarray:
+        """Positions of the given film ids, ignoring ids missing from the index."""
+        if not film_ids or len(self.film_ids) == 0:
+            return np.empty(0, dtype=np.int64)
+        ids = np.unique(np.asarray(film_ids, dtype=np.int64))
+        positions = np.minimum(np.searchsorted(self.film_ids, ids), len(self.film_ids) - 1)
+        return positions[self.film_ids[positions] == ids]
+
+    def _edges(self, positions: np.ndarray) -> np.ndarray:
+        """Indices into ``neighbours``/``scores`` of all edges of the given films."""
+        if len(positions) == 0:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([
+            np.arange(self.offsets[p], self.offsets[p + 1]) for p in positions
+        ])
+
+    def _profile_matrix(self, film_id_lists: Sequence[List[int]]) -> sparse.csr_matrix:
+        """
+        (profiles x films) indicator matrix of the given film ids,
+        ignoring ids missing from the index.
+        """
+        rows = np.repeat(
+            np.arange(len(film_id_lists)), [len(film_ids) for film_ids in film_id_lists]
+        )
+        ids = np.fromiter(chain.from_iterable(film_id_lists), dtype=np.int64, count=len(rows))
+        positions = np.minimum(
+            np.searchsorted(self.film_ids, ids.astype(self.film_ids.dtype)),
+            len(self.film_ids) - 1
+        )
+        known = self.film_ids[positions] == ids
+
+        matrix = sparse.csr_matrix(
+            (np.ones(known.sum(), dtype=np.float32), (rows[known], positions[known])),
+            shape=(len(film_id_lists), len(self.film_ids))
+        )
+        # Duplicate ids were summed
+        matrix.data[:] = 1
+        return matrix
+
+    def _rank(self, candidates: np.ndarray, raw_scores: np.ndarray, limit: int) -> List[int]:
+        """Re-rank candidate positions by raw score and rating, best first."""
+        # Pool of 3x the limit by raw score, ties broken by film id
+        pool_size = limit * 3
+        order = np.lexsort((self.film_ids[candidates], -raw_scores))
+        pool = candidates[order[:pool_size]]
+        pool_scores = raw_scores[order[:pool_size]]
+
+        # Re-rank with the rating boost (0-10 rating -> 0-50% boost)
+        final_scores = pool_scores * (1 + self.vote_average[pool] / 20.0)
+        order = np.lexsort((self.film_ids[pool], -final_scores))
+        return self.film_ids[pool[order[:limit]]].tolist()
+
+    def similar(self, film_id: int, limit: int) -> List[int]:
+        """Ids of the most similar films, best first."""
+        positions = self._positions([film_id])
+        if len(positions) == 0:
+            return []
+        start = self.offsets[positions[0]]
+        end = min(self.offsets[positions[0] + 1], start + limit)
+        return self.film_ids[self.neighbours[start:end]].tolist()
+
+    def recommend(
+        self,
+        positive_film_ids: List[int],
+        disliked_film_ids: List[int],
+        limit: int
+    ) -> List[int]:
+        """
+        Ids of recommended films, best first.
+        Same scoring as RecommendationEngine.get_recommendations.
+        """
+        positive = self._positions(positive_film_ids)
+        disliked = self._positions(disliked_film_ids)
+
+        raw_scores = np.zeros(len(self.film_ids), dtype=np.float64)
+        reached = np.zeros(len(self.film_ids), dtype=bool)
+
+        edges = self._edges(positive)
+        np.add.at(raw_scores, self.neighbours[edges], self.scores[edges])
+        reached[self.neighbours[edges]] = True
+
+        edges = self._edges(disliked)
+        np.add.at(raw_scores, self.neighbours[edges], -0.5 * self.scores[edges])
+
+        # Skip if already selected, liked, or disliked
+        reached[positive] = False
+        reached[disliked] = False
+        candidates = np.flatnonzero(reached)
+        if len(candidates) == 0:
+            return []
+
+        return self._rank(candidates, raw_scores[candidates], limit)
+
+    def recommend_batch(
+        self,
+        profiles: Sequence[Tuple[List[int], List[int]]],
+        limit: int
+    ) -> List[List[int]]:
+        """
+        Ids of recommended films for many (positive_film_ids, disliked_film_ids)
+        profiles, with the same scoring as ``recommend``.
+
+        The raw scores of all profiles are one sparse (profiles x films) x
+        (films x films) product; only the re-ranking runs per profile, on
+        the films each profile reaches.
+        """
+        if not profiles or len(self.film_ids) == 0:
+            return [[] for _ in profiles]
+
+        positive = self._profile_matrix([profile[0] for profile in profiles])
+        disliked = self._profile_matrix([profile[1] for profile in profiles])
+
+        raw_scores = ((positive - 0.5 * disliked) @ self.graph).tocsr()
+
+        # Only films reached from a positive film are candidates,
+        # skipping those already selected, liked, or disliked
+        reached = (positive.astype(bool) @ self.reach).astype(np.int8)
+        excluded = (positive + disliked).astype(bool)
+        candidates = sparse.csr_matrix(reached - reached.multiply(excluded))
+        candidates.eliminate_zeros()
+        candidates.sort_indices()
+
+        # Raw score of every candidate (scores cancelled out to zero are
+        # missing from the product and read back as zero)
+        rows = np.repeat(np.arange(len(profiles)), np.diff(candidates.indptr))
+        candidate_scores = np.asarray(
+            raw_scores[rows, candidates.indices], dtype=np.float64
+        ).ravel()
+
+        recommendations = []
+        for row in range(len(profiles)):
+            start, end = candidates.indptr[row], candidates.indptr[row + 1]
+            if start == end:
+                recommendations.append([])
+                continue
+            recommendations.append(self._rank(
+                candidates.indices[start:end], candidate_scores[start:end], limit
+            ))
+        return recommendations
@@ -0,0 +1,162 @@
+import base64
+import json
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy import Select, and_, func, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.models.film import Film, POPULAR_SORT_KEYS
+from app.services.catalog_versions import FILMS, get_version
+from app.services.facet_index import FacetIndex
+
+# Filter out Indian films and other specific languages (User Request)
+EXCLUDED_LANGUAGES = ['hi', 'te', 'ta', 'ml', 'kn', 'mr', 'bn', 'pa', 'gu']
+
+# Filter out specific unwanted films (User Request)
+EXCLUDED_TITLES = ["High School of the Dead", "Highschool of the Dead"]
+
+
+# In-memory facet bitsets of the browsable catalog
+_facet_index: Optional[FacetIndex] = None
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def browsable_condition(today: str):
+    """Eligibility rules of the popular listing, as of ``today`` (YYYY-MM-DD)."""
+    return and_(
+        Film.original_language.notin_(EXCLUDED_LANGUAGES),
+        Film.titre.notin_(EXCLUDED_TITLES),
+        # Filter out films without posters (User Request)
+        Film.poster_url.isnot(None),
+        # Filter out unreleased films (User Request)
+        # Assuming release_date is stored as string YYYY-MM-DD
+        Film.release_date <= today
+    )
+
+
+def refresh_browsable_films(db: Session, tmdb_ids: Iterable[int] = None) -> int:
+    """
+    Recompute Film.is_browsable, for the given films or the whole catalog.
+    Only rows whose flag changes are written. Runs in the caller's
+    transaction; returns the number of films updated.
+    """
+    today = datetime.now().strftime("%Y-%m-%d")
+    browsable = func.coalesce(browsable_condition(today), False)
+
+    statement = update(Film).where(Film.is_browsable.is_distinct_from(browsable))
+    if tmdb_ids is not None:
+        statement = statement.where(Film.tmdb_id.in_(list(tmdb_ids)))
+
+    return db.execute(
+        statement.values(is_browsable=browsable),
+        execution_options={"synchronize_session": False}
+    ).rowcount
+
+
+def get_facet_index() -> Optional[FacetIndex]:
+    """The loaded facet index, if any."""
+    return _facet_index
+
+
+def refresh_facet_index(db: Session) -> bool:
+    """
+    Load the facet index, or reload it if the films table changed since
+    it was loaded. Returns True if (re)loaded.
+    """
+    global _facet_index
+    if _facet_index is not None and _facet_index.version == get_version(db, FILMS):
+        return False
+
+    _facet_index = FacetIndex.load(db)
+    return True
+
+
+def popular_films_query(
+    genre: Optional[str] = None,
+    year: Optional[int] = None,
+    min_rating: Optional[float] = None
+) -> Select:
+    """
+    Films shown in the popular listing, with optional filters.
+    Eligibility is precomputed in Film.is_browsable so the query only
+    touches the partial ix_films_browsable_* indexes.
+    """
+    query = select(Film).where(Film.is_browsable)
+
+    # Apply filters
+    if genre:
+        query = query.where(Film.genres.contains([genre]))
+
+    if year:
+        query = query.where(Film.annee == year)
+
+    if min_rating:
+        query = query.where(Film.vote_average >= min_rating)
+
+    return query
+
+
+def popular_sort_key(sort_by: str) -> tuple:
+    """Sort key of a popular listing mode, with Film.id breaking ties."""
+    return (*POPULAR_SORT_KEYS[sort_by], Film.id)
+
+
+def encode_cursor(sort_by: str, values: list) -> str:
+    """Opaque cursor for the sort key values of the last film of a page."""
+    payload = json.dumps({"s": sort_by, "k": values}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str) -> list:
+    """Sort key values encoded in a cursor issued for the same ``sort_by``."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        values = payload["k"]
+        valid = (
+            payload["s"] == sort_by
+            and isinstance(values, list)
+            and len(values) == len(POPULAR_SORT_KEYS[sort_by]) + 1
+            and all(isinstance(value, (int, float)) for value in values)
+        )
+    except (ValueError, KeyError, TypeError):
+        valid = False
+
+    if not valid:
+        raise InvalidCursor("Invalid cursor")
+    return values
+
+
+async def get_popular_page(
+    db: AsyncSession,
+    query: Select,
+    sort_by: str,
+    limit: int,
+    cursor: Optional[str] = None
+) -> Tuple[List[Film], Optional[str]]:
+    """
+    Fetch a page of ``query`` with keyset pagination.
+
+    Rows are ordered by the sort key of ``sort_by`` then id, all descending,
+    and the page starts strictly after the row encoded in ``cursor``. This
+    is a range scan on the matching ix_films_browsable_* index, so every page
+    costs the same however deep it is. Returns (films, next_cursor).
+    """
+    sort_key = popular_sort_key(sort_by)
+
+    if cursor:
+        query = query.where(tuple_(*sort_key) < tuple_(*decode_cursor(cursor, sort_by)))
+
+    # One extra row tells whether there is a next page
+    query = query.order_by(*(column.desc() for column in sort_key)).limit(limit + 1)
+    rows = (await db.execute(query.add_columns(*sort_key))).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(sort_by, list(rows[-1][1:]))
+
+    return [row[0] for row in rows], next_cursor
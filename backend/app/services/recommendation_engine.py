@@ -1,133 +1,507 @@
+import hashlib
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from typing import List, Dict, Tuple
+from itertools import chain
+from scipy import sparse
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
+from sqlalchemy import Integer, any_, case, func, literal, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from app.core.config import get_settings
 from app.models.film import Film, Similarity
+from app.services.ann_search import LSHIndex
+from app.services.batch_recommendations import (
+    Profile,
+    default_workers,
+    iter_batch_recommendations
+)
+from app.services.catalog_versions import FILMS, SIMILARITIES, get_version
+from app.services.feature_store import FeatureStore
+from app.services.film_features import (
+    FilmFeaturizer,
+    combine_blocks,
+    feature_hash,
+    film_documents
+)
+from app.services.neighbour_index import NeighbourIndex
+from app.services.similarity_search import iter_score_blocks, iter_top_k
+from app.services.similarity_store import (
+    find_referencing_films,
+    load_neighbour_thresholds,
+    load_neighbours,
+    patch_similarities,
+    replace_similarities
+)
+
+settings = get_settings()
+
+
+def recommendation_request_key(
+    selected_film_ids: List[int],
+    liked_film_ids: List[int],
+    disliked_film_ids: List[int],
+    limit: int
+) -> str:
+    """Digest of a recommendation request, ignoring id order and duplicates."""
+    canonical = "|".join(
+        ",".join(map(str, sorted(set(film_ids))))
+        for film_ids in (selected_film_ids, liked_film_ids, disliked_film_ids)
+    )
+    canonical += f"|{limit}"
+    return hashlib.blake2b(canonical.encode("ascii"), digest_size=16).hexdigest()
 
 
 class RecommendationEngine:
     """Engine for computing film recommendations and similarities."""
     
     def __init__(self):
-        self.vectorizer = TfidfVectorizer(
-            max_features=5000,
-            stop_words='english',
-            ngram_range=(1, 2)
-        )
+        self.featurizer = FilmFeaturizer()
+        self.neighbour_index: Optional[NeighbourIndex] = None
     
-    def _create_film_features(self, film: Film) -> str:
-        """Create text features from film data for TF-IDF."""
-        features = []
-        
-        # Genres (weighted more heavily)
-        if film.genres:
-            features.extend(film.genres * 3)  # Repeat 3 times for higher weight
-        
-        # Keywords
-        if film.keywords:
-            features.extend(film.keywords * 2)  # Repeat 2 times
-        
-        # Director
-        if film.director:
-            features.append(film.director)
-        
-        # Actors
-        if film.actors:
-            features.extend(film.actors)
-        
-        # Title words
-        if film.titre:
-            features.extend(film.titre.lower().split())
-            
-        # Overview (Synopsis) - Adds semantic context
-        if film.overview:
-            # Give overview words less weight than keywords/genres but valuable context
-            features.extend(film.overview.lower().split())
-        
-        return " ".join(features)
+    def _load_feature_rows(self, db: Session) -> list:
+        """Load the columns used to build film features, ordered by id."""
+        return (
+            db.query(
+                Film.id,
+                Film.titre,
+                Film.genres,
+                Film.keywords,
+                Film.director,
+                Film.actors,
+                Film.overview
+            )
+            .order_by(Film.id)
+            .all()
+        )
     
     def compute_similarities(
         self, 
         db: Session, 
-        batch_size: int = 100
+        batch_size: int = 100,
+        top_n: int = None,
+        memory_budget_mb: int = None,
+        weights: Dict[str, float] = None
     ) -> int:
         """
         Compute similarities for all films and store in database.
         Returns number of similarity pairs created.
+        
+        Neighbours are selected block by block so peak memory stays within
+        ``memory_budget_mb`` instead of growing with the square of the catalog.
+        Fields are weighted with ``weights`` (default: settings.feature_weights).
         """
+        if top_n is None:
+            top_n = settings.similarity_top_n  # Store top 20 most similar films
+        if memory_budget_mb is None:
+            memory_budget_mb = settings.similarity_memory_budget_mb
+        if weights is None:
+            weights = settings.feature_weights
+        
         # Get all films
-        films = db.query(Film).all()
+        films = self._load_feature_rows(db)
         
         if len(films) < 2:
             return 0
         
-        # Create feature strings
-        film_features = [self._create_film_features(film) for film in films]
+        # Vectorize every field into its own TF-IDF block
+        documents = [film_documents(film) for film in films]
+        film_ids = [film.id for film in films]
+        
+        self.featurizer = FilmFeaturizer()
+        blocks = self.featurizer.fit_transform(documents)
+        tfidf_matrix = combine_blocks(blocks, weights)
+        
+        # Stream the top N similar films for each film into the database
+        rows = self._iter_similarity_rows(
+            tfidf_matrix,
+            film_ids,
+            top_n=top_n,
+            memory_budget_mb=memory_budget_mb
+        )
+        
+        similarities_created = replace_similarities(db, rows)
+        
+        # Keep the fitted state for later incremental updates
+        FeatureStore(settings.feature_store_dir).save(
+            self.featurizer,
+            blocks,
+            film_ids,
+            [feature_hash(document) for document in documents],
+            weights
+        )
+        
+        return similarities_created
+    
+    def _current_blocks(self, films: list, store: FeatureStore) -> tuple:
+        """
+        Field blocks of ``films`` from the feature store, vectorizing only
+        films that are new or changed since it was saved.
+        Returns (blocks, film_ids, feature_hashes, changed, removed_ids,
+        weights) where ``changed`` are positions in ``films``.
+        """
+        self.featurizer = FilmFeaturizer()
+        stored_blocks, stored_ids, stored_hashes, weights = store.load(self.featurizer)
+        stored_positions = {film_id: pos for pos, film_id in enumerate(stored_ids.tolist())}
+        
+        documents = [film_documents(film) for film in films]
+        film_ids = [film.id for film in films]
+        feature_hashes = [feature_hash(document) for document in documents]
+        
+        # Detect new/changed films by feature fingerprint
+        changed = [
+            i for i, (film_id, fingerprint) in enumerate(zip(film_ids, feature_hashes))
+            if stored_hashes.get(film_id) != fingerprint
+        ]
+        current_ids = set(film_ids)
+        removed_ids = [film_id for film_id in stored_hashes if film_id not in current_ids]
+        
+        # Reuse stored vectors and only transform changed films
+        changed_set = set(changed)
+        unchanged = [i for i in range(len(films)) if i not in changed_set]
+        unchanged_rows = [stored_positions[film_ids[i]] for i in unchanged]
+        changed_blocks = self.featurizer.transform([documents[i] for i in changed])
+        order = np.argsort(unchanged + changed)
+        
+        blocks = {}
+        for field, stored_block in stored_blocks.items():
+            blocks[field] = sparse.vstack([
+                stored_block[unchanged_rows],
+                changed_blocks[field]
+            ]).tocsr()[order]
+        
+        return blocks, film_ids, feature_hashes, changed, removed_ids, weights
+    
+    def update_similarities(
+        self,
+        db: Session,
+        top_n: int = None,
+        memory_budget_mb: int = None
+    ) -> int:
+        """
+        Incrementally update similarities for new, changed or removed films.
+        Returns number of similarity rows written.
+        
+        Reuses the vocabularies, IDF weights and per-film field blocks persisted
+        by the last full computation, so only changed films are vectorized and
+        scored, with the field weights of the stored similarities.
+        Terms unseen at fit time are ignored until the next full rebuild.
+        Falls back to a full computation when no feature store exists.
+        """
+        if top_n is None:
+            top_n = settings.similarity_top_n
+        if memory_budget_mb is None:
+            memory_budget_mb = settings.similarity_memory_budget_mb
+        
+        store = FeatureStore(settings.feature_store_dir)
+        if not store.exists():
+            return self.compute_similarities(
+                db, top_n=top_n, memory_budget_mb=memory_budget_mb
+            )
+        
+        films = self._load_feature_rows(db)
+        blocks, film_ids, feature_hashes, changed, removed_ids, weights = (
+            self._current_blocks(films, store)
+        )
+        
+        if not changed and not removed_ids:
+            return 0
+        
+        tfidf_matrix = combine_blocks(blocks, weights)
+        changed_ids = [film_ids[i] for i in changed]
+        
+        # Lists pointing at a changed or removed film must be fully recomputed
+        recompute_ids = set(changed_ids) | set(
+            find_referencing_films(db, changed_ids + removed_ids)
+        )
+        recompute_ids -= set(removed_ids)
+        
+        # Reverse neighbours: changed films entering other films' lists
+        thresholds = load_neighbour_thresholds(db, top_n)
+        threshold_array = np.array([
+            thresholds.get(film_id, settings.similarity_min_score)
+            for film_id in film_ids
+        ])
+        candidates: Dict[int, List[Tuple[int, float]]] = {}
+        
+        changed_positions = np.array(changed, dtype=np.int64)
+        for start, scores in iter_score_blocks(
+            tfidf_matrix[changed_positions], tfidf_matrix, memory_budget_mb
+        ):
+            n_rows = scores.shape[0]
+            scores[np.arange(n_rows), changed_positions[start:start + n_rows]] = -np.inf
+            rows, columns = np.nonzero(scores > threshold_array)
+            for row, column in zip(rows, columns):
+                target_id = film_ids[column]
+                if target_id in recompute_ids:
+                    continue
+                candidates.setdefault(target_id, []).append(
+                    (film_ids[changed[start + row]], float(scores[row, column]))
+                )
+        
+        # Merge reverse candidates into the existing lists
+        merged_rows = []
+        for film_id, neighbours in load_neighbours(db, list(candidates)).items():
+            neighbours.extend(candidates[film_id])
+            neighbours.sort(key=lambda x: x[1], reverse=True)
+            merged_rows.extend(
+                (film_id, similar_id, score)
+                for similar_id, score in neighbours[:top_n]
+            )
+        
+        # Recompute the full lists of changed and stale films
+        recompute_positions = np.array(
+            [i for i, film_id in enumerate(film_ids) if film_id in recompute_ids],
+            dtype=np.int64
+        )
+        recomputed_rows = self._iter_similarity_rows(
+            tfidf_matrix,
+            film_ids,
+            top_n=top_n,
+            memory_budget_mb=memory_budget_mb,
+            positions=recompute_positions
+        )
+        
+        similarities_written = patch_similarities(
+            db,
+            list(recompute_ids) + list(candidates),
+            chain(recomputed_rows, merged_rows),
+            removed_film_ids=removed_ids
+        )
+        
+        store.save(self.featurizer, blocks, film_ids, feature_hashes, weights)
+        
+        return similarities_written
+    
+    def reweight_similarities(
+        self,
+        db: Session,
+        weights: Dict[str, float] = None,
+        top_n: int = None,
+        memory_budget_mb: int = None
+    ) -> int:
+        """
+        Recompute all similarities with new field weights (default:
+        settings.feature_weights). Returns number of similarity pairs created.
+        
+        Field blocks come from the feature store, so only films changed
+        since it was saved are vectorized. Falls back to a full computation
+        when no feature store exists.
+        """
+        if top_n is None:
+            top_n = settings.similarity_top_n
+        if memory_budget_mb is None:
+            memory_budget_mb = settings.similarity_memory_budget_mb
+        if weights is None:
+            weights = settings.feature_weights
+        
+        store = FeatureStore(settings.feature_store_dir)
+        if not store.exists():
+            return self.compute_similarities(
+                db, top_n=top_n, memory_budget_mb=memory_budget_mb, weights=weights
+            )
+        
+        films = self._load_feature_rows(db)
+        blocks, film_ids, feature_hashes, _, _, _ = self._current_blocks(films, store)
+        
+        if len(film_ids) < 2:
+            return 0
+        
+        rows = self._iter_similarity_rows(
+            combine_blocks(blocks, weights),
+            film_ids,
+            top_n=top_n,
+            memory_budget_mb=memory_budget_mb
+        )
+        similarities_created = replace_similarities(db, rows)
         
-        # Compute TF-IDF matrix
-        tfidf_matrix = self.vectorizer.fit_transform(film_features)
+        store.save(self.featurizer, blocks, film_ids, feature_hashes, weights)
         
-        # Compute cosine similarity
-        similarity_matrix = cosine_similarity(tfidf_matrix)
+        return similarities_created
+    
+    def _iter_similarity_rows(
+        self,
+        tfidf_matrix,
+        film_ids: List[int],
+        top_n: int,
+        memory_budget_mb: int,
+        positions: np.ndarray = None
+    ) -> Iterator[Tuple[int, int, float]]:
+        """
+        Yield (film_id, similar_film_id, score) rows above the minimum score,
+        for all films or only for the matrix rows in ``positions``.
         
-        # Clear existing similarities
-        db.query(Similarity).delete()
+        Neighbours are exact, or approximate with the "lsh" similarity
+        backend (near-linear instead of quadratic in the catalog size).
+        """
+        if positions is None:
+            positions = np.arange(len(film_ids))
         
-        # Store top N similar films for each film
-        similarities_created = 0
-        top_n = 20  # Store top 20 most similar films
+        if settings.similarity_backend == "lsh":
+            neighbours = LSHIndex.build(
+                tfidf_matrix,
+                n_components=settings.ann_components,
+                n_tables=settings.ann_tables,
+                n_bits=settings.ann_bits,
+                seed=settings.ann_seed
+            ).iter_top_k(
+                top_n,
+                positions=positions,
+                max_bucket=settings.ann_max_bucket,
+                memory_budget_mb=memory_budget_mb
+            )
+        else:
+            neighbours = iter_top_k(
+                tfidf_matrix[positions],
+                tfidf_matrix,
+                top_n=top_n,
+                memory_budget_mb=memory_budget_mb,
+                self_indices=positions
+            )
         
-        for i, film in enumerate(films):
-            # Get similarity scores for this film
-            scores = similarity_matrix[i]
-            
-            # Get indices of top N similar films (excluding itself)
-            similar_indices = np.argsort(scores)[::-1][1:top_n+1]
-            
-            # Create similarity records
-            for similar_idx in similar_indices:
-                score = float(scores[similar_idx])
+        for i, similar_indices, scores in neighbours:
+            film_id = film_ids[positions[i]]
+            for similar_idx, score in zip(similar_indices, scores):
+                score = float(score)
                 
                 # Only store if similarity is significant
-                if score > 0.1:
-                    similarity = Similarity(
-                        film_id=film.id,
-                        similar_film_id=films[similar_idx].id,
-                        score=score
-                    )
-                    db.add(similarity)
-                    similarities_created += 1
-        
-        db.commit()
-        return similarities_created
+                if score > settings.similarity_min_score:
+                    yield film_id, film_ids[similar_idx], score
+    
+    def refresh_neighbour_index(self, db: Session) -> bool:
+        """
+        Load the in-memory neighbour index, or reload it if the similarities
+        table was rebuilt since it was loaded. When only films changed
+        (e.g. ratings from an ingest), only the ratings are reloaded.
+        Returns True if (re)loaded.
+        """
+        index = self.neighbour_index
+        if index is None or index.version != get_version(db, SIMILARITIES):
+            self.neighbour_index = NeighbourIndex.load(db)
+            return True
+        
+        if index.films_version != get_version(db, FILMS):
+            self.neighbour_index = index.refresh_ratings(db)
+            return True
+        return False
     
-    def get_similar_films(
+    def iter_recommendations_batch(
         self,
         db: Session,
+        profiles: Iterable[Profile],
+        limit: int = 10,
+        workers: int = None,
+        chunk_size: int = None
+    ) -> Iterator[List[int]]:
+        """
+        Recommended film ids for many (selected, liked, disliked) profiles,
+        yielded in input order, e.g. for offline digests.
+        
+        Same scoring as get_recommendations, computed in memory from the
+        neighbour index (loaded for the call if it is not enabled).
+        """
+        if workers is None:
+            workers = default_workers(settings.recommendation_batch_workers)
+        if chunk_size is None:
+            chunk_size = settings.recommendation_batch_chunk_size
+        
+        if self.neighbour_index is not None:
+            self.refresh_neighbour_index(db)
+            index = self.neighbour_index
+        else:
+            index = NeighbourIndex.load(db)
+        
+        return iter_batch_recommendations(
+            index, profiles, limit=limit, workers=workers, chunk_size=chunk_size
+        )
+    
+    async def _hydrate_films(self, db: AsyncSession, film_ids: List[int]) -> List[Film]:
+        """Fetch films by id, keeping the order of ``film_ids``."""
+        if not film_ids:
+            return []
+        result = await db.execute(select(Film).where(Film.id.in_(film_ids)))
+        films = result.scalars().all()
+        film_map = {film.id: film for film in films}
+        return [film_map[film_id] for film_id in film_ids if film_id in film_map]
+    
+    async def get_similar_films(
+        self,
+        db: AsyncSession,
         film_id: int,
         limit: int = 2
     ) -> List[Film]:
         """Get most similar films for a given film."""
-        similarities = (
-            db.query(Similarity)
-            .filter(Similarity.film_id == film_id)
+        if self.neighbour_index is not None:
+            return await self._hydrate_films(
+                db, self.neighbour_index.similar(film_id, limit)
+            )
+        
+        result = await db.execute(
+            select(Similarity.similar_film_id)
+            .where(Similarity.film_id == film_id)
             .order_by(Similarity.score.desc())
             .limit(limit)
-            .all()
         )
+        similar_film_ids = result.scalars().all()
         
-        similar_film_ids = [s.similar_film_id for s in similarities]
+        result = await db.execute(
+            select(Film).where(Film.id.in_(similar_film_ids))
+        )
+        return result.scalars().all()
+    
+    async def get_similar_films_batch(
+        self,
+        db: AsyncSession,
+        film_ids: List[int],
+        limit: int = 2
+    ) -> Dict[int, List[Film]]:
+        """
+        Get the most similar films of many films at once, best first.
+        Films without neighbours map to an empty list.
+        """
+        film_ids = list(dict.fromkeys(film_ids))
+        similar: Dict[int, List[Film]] = {film_id: [] for film_id in film_ids}
+        if not film_ids:
+            return similar
         
-        return (
-            db.query(Film)
-            .filter(Film.id.in_(similar_film_ids))
-            .all()
+        if self.neighbour_index is not None:
+            similar_ids = {
+                film_id: self.neighbour_index.similar(film_id, limit)
+                for film_id in film_ids
+            }
+            films = await self._hydrate_films(
+                db, list(set(chain.from_iterable(similar_ids.values())))
+            )
+            film_map = {film.id: film for film in films}
+            for film_id, ids in similar_ids.items():
+                similar[film_id] = [film_map[i] for i in ids if i in film_map]
+            return similar
+        
+        # Top ``limit`` neighbours of every film in one query
+        ranked = (
+            select(
+                Similarity.film_id,
+                Similarity.similar_film_id,
+                func.row_number().over(
+                    partition_by=Similarity.film_id,
+                    order_by=Similarity.score.desc()
+                ).label("rank")
+            )
+            .where(Similarity.film_id == any_(literal(film_ids, ARRAY(Integer))))
+            .subquery()
+        )
+        result = await db.execute(
+            select(ranked.c.film_id, Film)
+            .join(Film, Film.id == ranked.c.similar_film_id)
+            .where(ranked.c.rank <= limit)
+            .order_by(ranked.c.film_id, ranked.c.rank)
         )
+        for film_id, film in result.all():
+            similar[film_id].append(film)
+        return similar
     
-    def get_recommendations(
+    async def get_recommendations(
         self,
-        db: Session,
+        db: AsyncSession,
         selected_film_ids: List[int],
         liked_film_ids: List[int] = None,
         disliked_film_ids: List[int] = None,
@@ -136,6 +510,9 @@ class RecommendationEngine:
         """
         Get film recommendations based on selected films and feedback.
         Includes quality re-ranking to favor better-rated films.
+        
+        Scoring, candidate pooling and re-ranking run as a single SQL
+        statement, so the cost does not grow with the number of input films.
         """
         if liked_film_ids is None:
             liked_film_ids = []
@@ -145,80 +522,58 @@ class RecommendationEngine:
         # Combine selected and liked films
         positive_film_ids = list(set(selected_film_ids + liked_film_ids))
         
-        # Get all similar films with scores
-        film_scores: Dict[int, float] = {}
-        
-        for film_id in positive_film_ids:
-            similarities = (
-                db.query(Similarity)
-                .filter(Similarity.film_id == film_id)
-                .all()
-            )
-            
-            for sim in similarities:
-                similar_id = sim.similar_film_id
-                
-                # Skip if already selected, liked, or disliked
-                if similar_id in positive_film_ids or similar_id in disliked_film_ids:
-                    continue
-                
-                # Accumulate scores
-                if similar_id in film_scores:
-                    film_scores[similar_id] += sim.score
-                else:
-                    film_scores[similar_id] = sim.score
-        
-        # Penalize disliked films' similar films
-        for disliked_id in disliked_film_ids:
-            similarities = (
-                db.query(Similarity)
-                .filter(Similarity.film_id == disliked_id)
-                .all()
+        # Score in memory when the neighbour index is loaded
+        if self.neighbour_index is not None:
+            return await self._hydrate_films(
+                db,
+                self.neighbour_index.recommend(
+                    positive_film_ids, disliked_film_ids, limit
+                )
             )
-            
-            for sim in similarities:
-                similar_id = sim.similar_film_id
-                if similar_id in film_scores:
-                    film_scores[similar_id] -= sim.score * 0.5  # Reduce score
         
-        # Initial sort by raw similarity
-        sorted_candidates = sorted(
-            film_scores.items(),
-            key=lambda x: x[1],
-            reverse=True
+        excluded_film_ids = list(set(positive_film_ids + disliked_film_ids))
+        
+        # Similar films of positive films add their score,
+        # similar films of disliked films lose half of theirs
+        is_positive = Similarity.film_id.in_(positive_film_ids)
+        weight = (
+            case((is_positive, 1.0), else_=0.0)
+            - case((Similarity.film_id.in_(disliked_film_ids), 0.5), else_=0.0)
         )
+        raw_score = func.sum(Similarity.score * weight)
         
         # Take a larger pool of candidates for re-ranking (e.g. 3x the limit)
         # This allows us to filter out low-quality films that might be highly similar
         pool_size = limit * 3
-        top_candidate_ids = [film_id for film_id, _ in sorted_candidates[:pool_size]]
-        
-        if not top_candidate_ids:
-            return []
-            
-        # Fetch candidate films to get their ratings
-        candidates = db.query(Film).filter(Film.id.in_(top_candidate_ids)).all()
-        candidate_map = {f.id: f for f in candidates}
+        candidates = (
+            select(
+                Similarity.similar_film_id.label("film_id"),
+                raw_score.label("raw_score")
+            )
+            .where(Similarity.film_id.in_(excluded_film_ids))
+            # Skip if already selected, liked, or disliked
+            .where(Similarity.similar_film_id.notin_(excluded_film_ids))
+            .group_by(Similarity.similar_film_id)
+            # Only films reached from a positive film are candidates
+            .having(func.bool_or(is_positive))
+            .order_by(raw_score.desc(), Similarity.similar_film_id)
+            .limit(pool_size)
+            .subquery()
+        )
         
         # Re-rank based on Quality Score
         # Final Score = Similarity * (1 + Rating Boost)
         # This gives a slight edge to better movies without ignoring similarity
-        final_scores = []
+        # Normalize rating (0-10) to a boost factor (0.0 - 0.5)
+        # A 10/10 movie gets a 50% score boost. A 0/10 movie gets 0% boost.
+        rating_boost = func.coalesce(Film.vote_average, 0) / 20.0
+        final_score = candidates.c.raw_score * (1 + rating_boost)
         
-        for film_id, raw_score in sorted_candidates[:pool_size]:
-            film = candidate_map.get(film_id)
-            if not film:
-                continue
-                
-            # Normalize rating (0-10) to a boost factor (0.0 - 0.5)
-            # A 10/10 movie gets a 50% score boost. A 0/10 movie gets 0% boost.
-            rating_boost = (film.vote_average or 0) / 20.0 
-            
-            final_score = raw_score * (1 + rating_boost)
-            final_scores.append((film, final_score))
-            
-        # Sort by final quality-adjusted score
-        final_scores.sort(key=lambda x: x[1], reverse=True)
-        
-        # Return top N films
-        return [item[0] for item in final_scores[:limit]]
+        # Return top N films, fetched with their scores in a single query
+        result = await db.execute(
+            select(Film)
+            .join(candidates, Film.id == candidates.c.film_id)
+            .order_by(final_score.desc(), Film.id)
+            .limit(limit)
+        )
+        return result.scalars().all()
@@ -0,0 +1,98 @@
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+from typing import Iterator, Optional, Tuple
+
+# Bytes needed per (query row x corpus column) cell while a block is scored:
+# the dense float64 scores plus the float64 copy made by partition and the
+# boolean selection mask, with headroom for the sparse product before it
+# is densified.
+_BYTES_PER_CELL = 24
+
+
+def block_rows_for_budget(n_columns: int, memory_budget_mb: int) -> int:
+    """Number of query rows that fit in one scoring block under the budget."""
+    budget_bytes = max(memory_budget_mb, 1) * 1024 * 1024
+    return max(1, budget_bytes // (_BYTES_PER_CELL * max(n_columns, 1)))
+
+
+def iter_score_blocks(
+    query: sparse.spmatrix,
+    corpus: sparse.spmatrix,
+    memory_budget_mb: int = 512,
+) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Yield ``(start_row, scores)`` dense cosine score blocks of query x corpus.
+
+    Only one (block x corpus) slice is materialized at a time; the block
+    height is derived from the memory budget.
+    """
+    query = normalize(sparse.csr_matrix(query))
+    corpus_t = normalize(sparse.csr_matrix(corpus)).T.tocsc()
+
+    n_query = query.shape[0]
+    n_corpus = corpus_t.shape[1]
+    if n_query == 0 or n_corpus == 0:
+        return
+
+    block_rows = block_rows_for_budget(n_corpus, memory_budget_mb)
+
+    for start in range(0, n_query, block_rows):
+        end = min(start + block_rows, n_query)
+        yield start, (query[start:end] @ corpus_t).toarray()
+
+
+def top_k_from_scores(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return the k best columns of each row of a score block, sorted
+    descending. Equal scores are ordered by column (films are ordered by
+    id, so the lower film id wins a tie).
+    """
+    n_rows, n_columns = scores.shape
+    k = min(k, n_columns)
+
+    # Partial selection of the k-th best score of every row; rows with more
+    # than k columns at least that good have ties at the boundary
+    kth = np.partition(scores, n_columns - k, axis=1)[:, n_columns - k]
+    selected = scores >= kth[:, None]
+    tied_rows = np.flatnonzero(selected.sum(axis=1) > k)
+    for row in tied_rows:
+        # Keep the better columns, then the first tied ones
+        ties = np.flatnonzero(scores[row] == kth[row])
+        selected[row, ties[k - (selected[row].sum() - len(ties)):]] = False
+
+    rows, columns = np.divmod(np.flatnonzero(selected), n_columns)
+    top_scores = scores[rows, columns]
+    order = np.lexsort((columns, -top_scores, rows))
+    return columns[order].reshape(n_rows, k), top_scores[order].reshape(n_rows, k)
+
+
+def iter_top_k(
+    query: sparse.spmatrix,
+    corpus: sparse.spmatrix,
+    top_n: int,
+    memory_budget_mb: int = 512,
+    self_indices: Optional[np.ndarray] = None,
+) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+    """
+    Yield the top-N cosine neighbours of every query row against the corpus.
+
+    Rows are scored in blocks so that only a (block x corpus) dense slice is
+    ever materialized, instead of the full query x corpus matrix. Each item is
+    ``(query_row, corpus_indices, scores)`` with scores sorted descending.
+    ``self_indices[i]`` is the corpus position of query row ``i``; it is
+    excluded from its own neighbours.
+    """
+    n_corpus = corpus.shape[0]
+    k = min(top_n, n_corpus - 1 if self_indices is not None else n_corpus)
+    if k <= 0:
+        return
+
+    for start, scores in iter_score_blocks(query, corpus, memory_budget_mb):
+        n_rows = scores.shape[0]
+        if self_indices is not None:
+            scores[np.arange(n_rows), self_indices[start:start + n_rows]] = -np.inf
+
+        top, top_scores = top_k_from_scores(scores, k)
+        for offset in range(n_rows):
+            yield start + offset, top[offset], top_scores[offset]
@@ -0,0 +1,264 @@
+import io
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Tuple
+from sqlalchemy import column, delete, func, or_, select, table, text
+from sqlalchemy.orm import Session
+from app.core.config import get_settings
+from app.models.film import Similarity
+from app.services.catalog_versions import SIMILARITIES, bump_version
+
+settings = get_settings()
+
+SimilarityRow = Tuple[int, int, float]
+
+STAGING_SUFFIX = "_staging"
+
+
+def _chunks(rows: Iterable[SimilarityRow], size: int) -> Iterator[List[SimilarityRow]]:
+    """Split an iterable of rows into lists of at most ``size`` items."""
+    iterator = iter(rows)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _copy_chunk(
+    db: Session,
+    table_name: str,
+    columns: List[str],
+    chunk: List[Tuple]
+) -> None:
+    """Write one chunk with COPY, falling back to executemany."""
+    dbapi_connection = db.connection().connection.dbapi_connection
+
+    with dbapi_connection.cursor() as cursor:
+        if hasattr(cursor, "copy_expert"):
+            buffer = io.StringIO()
+            for row in chunk:
+                buffer.write("\t".join(repr(value) for value in row))
+                buffer.write("\n")
+            buffer.seek(0)
+            cursor.copy_expert(
+                f"COPY {table_name} ({', '.join(columns)}) FROM STDIN",
+                buffer
+            )
+            return
+
+    target = table(table_name, *[column(name) for name in columns])
+    db.execute(target.insert(), [dict(zip(columns, row)) for row in chunk])
+
+
+def write_similarities(
+    db: Session,
+    rows: Iterable[SimilarityRow],
+    table_name: str = None,
+    chunk_size: int = None,
+    with_ids: bool = False
+) -> int:
+    """
+    Stream (film_id, similar_film_id, score) rows into a table in chunks.
+    Returns number of rows written. Does not commit.
+    
+    With ``with_ids`` the primary keys are numbered from 1, which keeps the
+    id sequence small across full rebuilds.
+    """
+    if table_name is None:
+        table_name = Similarity.__tablename__
+    if chunk_size is None:
+        chunk_size = settings.similarity_write_chunk_size
+
+    columns = ["film_id", "similar_film_id", "score"]
+    if with_ids:
+        columns.insert(0, "id")
+
+    written = 0
+    for chunk in _chunks(rows, chunk_size):
+        if with_ids:
+            chunk = [
+                (written + offset + 1, *row)
+                for offset, row in enumerate(chunk)
+            ]
+        _copy_chunk(db, table_name, columns, chunk)
+        written += len(chunk)
+
+    return written
+
+
+def _build_staging_table(db: Session, staging: str) -> None:
+    """Create an empty staging copy of the similarities table (no indexes)."""
+    live = Similarity.__tablename__
+    db.execute(text(f"DROP TABLE IF EXISTS {staging}"))
+    db.execute(text(
+        f"CREATE TABLE {staging} (LIKE {live} INCLUDING DEFAULTS)"
+    ))
+
+
+def _index_staging_table(db: Session, staging: str) -> None:
+    """Add the constraints and indexes of the live table to the staging copy."""
+    db.execute(text(
+        f"ALTER TABLE {staging} ADD CONSTRAINT {staging}_pkey PRIMARY KEY (id)"
+    ))
+
+    for fk in Similarity.__table__.foreign_keys:
+        db.execute(text(
+            f"ALTER TABLE {staging} ADD CONSTRAINT {staging}_{fk.parent.name}_fkey "
+            f"FOREIGN KEY ({fk.parent.name}) "
+            f"REFERENCES {fk.column.table.name} ({fk.column.name})"
+        ))
+
+    for index in Similarity.__table__.indexes:
+        columns = ", ".join(col.name for col in index.columns)
+        db.execute(text(
+            f"CREATE INDEX {index.name}{STAGING_SUFFIX} ON {staging} ({columns})"
+        ))
+
+    db.execute(text(f"ANALYZE {staging}"))
+
+
+def _swap_staging_table(db: Session, staging: str) -> None:
+    """Replace the live table with the staging table in a single transaction."""
+    live = Similarity.__tablename__
+    sequence = db.execute(
+        text("SELECT pg_get_serial_sequence(:table, 'id')"),
+        {"table": live}
+    ).scalar()
+
+    # Keep the id sequence alive when the old table is dropped
+    if sequence:
+        db.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY NONE"))
+
+    db.execute(text(f"DROP TABLE {live}"))
+    db.execute(text(f"ALTER TABLE {staging} RENAME TO {live}"))
+
+    # Restore the canonical constraint and index names
+    db.execute(text(
+        f"ALTER TABLE {live} RENAME CONSTRAINT {staging}_pkey TO {live}_pkey"
+    ))
+    for fk in Similarity.__table__.foreign_keys:
+        db.execute(text(
+            f"ALTER TABLE {live} RENAME CONSTRAINT "
+            f"{staging}_{fk.parent.name}_fkey TO {live}_{fk.parent.name}_fkey"
+        ))
+    for index in Similarity.__table__.indexes:
+        db.execute(text(
+            f"ALTER INDEX {index.name}{STAGING_SUFFIX} RENAME TO {index.name}"
+        ))
+
+    if sequence:
+        db.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {live}.id"))
+        db.execute(text(
+            f"SELECT setval('{sequence}', COALESCE((SELECT MAX(id) FROM {live}), 0) + 1, false)"
+        ))
+
+
+def replace_similarities(
+    db: Session,
+    rows: Iterable[SimilarityRow],
+    chunk_size: int = None
+) -> int:
+    """
+    Replace the whole similarities table with the given rows.
+
+    Rows are loaded into a staging table, indexed, then swapped with the live
+    table in one short transaction. Returns number of rows written.
+    """
+    staging = f"{Similarity.__tablename__}{STAGING_SUFFIX}"
+
+    try:
+        _build_staging_table(db, staging)
+        written = write_similarities(
+            db, rows, table_name=staging, chunk_size=chunk_size, with_ids=True
+        )
+        _index_staging_table(db, staging)
+        db.commit()
+
+        _swap_staging_table(db, staging)
+        bump_version(db, SIMILARITIES)
+        db.commit()
+    except Exception:
+        db.rollback()
+        db.execute(text(f"DROP TABLE IF EXISTS {staging}"))
+        db.commit()
+        raise
+
+    return written
+
+
+def load_neighbour_thresholds(db: Session, top_n: int) -> Dict[int, float]:
+    """
+    Score a new neighbour must beat to enter each film's stored list.
+    Films with fewer than ``top_n`` neighbours accept any significant score.
+    """
+    rows = db.execute(
+        select(
+            Similarity.film_id,
+            func.count(Similarity.id),
+            func.min(Similarity.score)
+        ).group_by(Similarity.film_id)
+    ).all()
+
+    return {
+        film_id: (min_score if count >= top_n else settings.similarity_min_score)
+        for film_id, count, min_score in rows
+    }
+
+
+def find_referencing_films(db: Session, similar_film_ids: List[int]) -> List[int]:
+    """Films whose stored neighbour lists contain any of the given films."""
+    if not similar_film_ids:
+        return []
+    rows = db.execute(
+        select(Similarity.film_id)
+        .where(Similarity.similar_film_id.in_(similar_film_ids))
+        .distinct()
+    ).all()
+    return [film_id for (film_id,) in rows]
+
+
+def load_neighbours(db: Session, film_ids: List[int]) -> Dict[int, List[Tuple[int, float]]]:
+    """Stored (similar_film_id, score) lists for the given films."""
+    neighbours: Dict[int, List[Tuple[int, float]]] = {film_id: [] for film_id in film_ids}
+    if not film_ids:
+        return neighbours
+    rows = db.execute(
+        select(Similarity.film_id, Similarity.similar_film_id, Similarity.score)
+        .where(Similarity.film_id.in_(film_ids))
+    ).all()
+    for film_id, similar_film_id, score in rows:
+        neighbours[film_id].append((similar_film_id, score))
+    return neighbours
+
+
+def patch_similarities(
+    db: Session,
+    film_ids: List[int],
+    rows: Iterable[SimilarityRow],
+    removed_film_ids: List[int] = None,
+    chunk_size: int = None
+) -> int:
+    """
+    Replace the neighbour lists of ``film_ids`` in place and drop every row
+    pointing at a removed film, in a single transaction.
+    Returns number of rows written.
+    """
+    removed_film_ids = removed_film_ids or []
+
+    try:
+        db.execute(
+            delete(Similarity).where(
+                or_(
+                    Similarity.film_id.in_(list(film_ids) + list(removed_film_ids)),
+                    Similarity.similar_film_id.in_(removed_film_ids)
+                )
+            )
+        )
+        written = write_similarities(db, rows, chunk_size=chunk_size)
+        bump_version(db, SIMILARITIES)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return written
@@ -0,0 +1,147 @@
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.models.film import Film
+from app.models.schemas import FilmResponse
+from app.services.catalog_versions import FILMS, get_version
+
+# Largest code point: upper bound of every string sharing a prefix
+_MAX_CHAR = chr(0x10FFFF)
+
+# Letters unaccent expands that NFKD leaves alone
+_LIGATURES = str.maketrans({"œ": "oe", "æ": "ae", "ø": "o", "đ": "d", "ł": "l"})
+
+
+def fold_title(text: str) -> str:
+    """
+    Accent- and case-folded form of a title, an approximation of
+    search_key's lower(unaccent(...)), not the same folding: casefold
+    also folds e.g. the final sigma "ς" (lower keeps it), and NFKD expands
+    compatibility forms ("²", full-width letters) that unaccent may keep.
+    In rare cases in-memory and SQL search can match differently.
+    """
+    decomposed = unicodedata.normalize("NFKD", text.casefold().translate(_LIGATURES))
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def _trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TitleIndex:
+    """
+    Read-only, in-memory autocomplete index over film titles.
+
+    Films are stored by popularity rank (position 0 is the most popular),
+    so every posting list sorted by position is sorted by popularity.
+    Prefix queries bisect a sorted array of folded titles; substring
+    queries intersect trigram posting lists and verify the candidates.
+    """
+
+    def __init__(
+        self,
+        films: List[FilmResponse],
+        titles: List[Tuple[str, ...]],
+        version: int
+    ):
+        self.films = films
+        self.titles = titles
+        self.version = version
+
+        keys = sorted(
+            (title, position)
+            for position, film_titles in enumerate(titles)
+            for title in film_titles
+        )
+        self._keys = [key for key, _ in keys]
+        self._key_positions = np.fromiter(
+            (position for _, position in keys), dtype=np.int32, count=len(keys)
+        )
+
+        postings: Dict[str, List[int]] = defaultdict(list)
+        for position, film_titles in enumerate(titles):
+            for trigram in set().union(*map(_trigrams, film_titles)):
+                postings[trigram].append(position)
+        self._postings = {
+            trigram: np.asarray(positions, dtype=np.int32)
+            for trigram, positions in postings.items()
+        }
+
+    @classmethod
+    def load(cls, db: Session) -> "TitleIndex":
+        """Build the index from the films table."""
+        version = get_version(db, FILMS)
+
+        films = db.execute(
+            select(Film).order_by(Film.popularity.desc().nulls_last(), Film.id)
+        ).scalars().all()
+        return cls.from_films(films, version)
+
+    @classmethod
+    def from_films(cls, films: Sequence, version: int) -> "TitleIndex":
+        """Build the index from film rows, most popular first."""
+        titles = []
+        for film in films:
+            folded = {fold_title(film.titre)} if film.titre else set()
+            if film.titre_original:
+                folded.add(fold_title(film.titre_original))
+            titles.append(tuple(folded))
+
+        return cls(
+            films=[FilmResponse.model_validate(film) for film in films],
+            titles=titles,
+            version=version
+        )
+
+    def __len__(self) -> int:
+        return len(self.films)
+
+    def _prefix_positions(self, folded: str) -> np.ndarray:
+        """Positions of films with a title starting with ``folded``, by popularity."""
+        start = bisect_left(self._keys, folded)
+        end = bisect_left(self._keys, folded + _MAX_CHAR, lo=start)
+        return np.unique(self._key_positions[start:end])
+
+    def _substring_candidates(self, folded: str) -> np.ndarray:
+        """Positions of films whose titles contain every trigram of ``folded``."""
+        postings = sorted(
+            (self._postings.get(trigram) for trigram in _trigrams(folded)),
+            key=lambda positions: 0 if positions is None else len(positions)
+        )
+        if postings[0] is None:
+            return np.empty(0, dtype=np.int32)
+
+        candidates = postings[0]
+        for positions in postings[1:]:
+            candidates = np.intersect1d(candidates, positions, assume_unique=True)
+            if len(candidates) == 0:
+                break
+        return candidates
+
+    def search(self, q: str, limit: int) -> List[FilmResponse]:
+        """
+        Top films matching a query: title prefix matches first, then (for
+        queries of three characters or more) substring matches, each group
+        ordered by popularity.
+        """
+        folded = fold_title(q.strip())
+        if not folded:
+            return []
+
+        results = self._prefix_positions(folded)[:limit].tolist()
+
+        if len(results) < limit and len(folded) >= 3:
+            seen = set(results)
+            for position in self._substring_candidates(folded).tolist():
+                if position in seen:
+                    continue
+                if any(folded in title for title in self.titles[position]):
+                    results.append(position)
+                    if len(results) == limit:
+                        break
+
+        return [self.films[position] for position in results]
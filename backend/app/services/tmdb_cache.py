@@ -0,0 +1,141 @@
+import json
+import sqlite3
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Optional
+from urllib.parse import urlencode
+
+# Parameters that never change the response and must not leak into keys
+IGNORED_PARAMS = {"api_key"}
+
+
+class TMDBCacheMiss(Exception):
+    """Raised in offline mode when a response is not in the cache."""
+
+
+class CachedResponse:
+    """A TMDB response stored on disk with its validators."""
+
+    def __init__(
+        self,
+        body: Dict[str, Any],
+        etag: Optional[str],
+        last_modified: Optional[str],
+        fetched_at: float
+    ):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+
+    def is_fresh(self, max_age_seconds: float) -> bool:
+        return time.time() - self.fetched_at < max_age_seconds
+
+    def validation_headers(self) -> Dict[str, str]:
+        """Headers for a conditional request revalidating this response."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class TMDBResponseCache:
+    """
+    SQLite-backed cache of TMDB JSON responses keyed by base URL, endpoint
+    and params.
+
+    Bodies are stored zlib-compressed along with their ETag/Last-Modified so
+    stale entries can be revalidated with a conditional request. In offline
+    mode every stored entry is served regardless of age, which makes a cache
+    file usable as a replayable fixture.
+    """
+
+    def __init__(self, path: str, max_age_seconds: float, offline: bool = False):
+        self.path = Path(path)
+        self.max_age_seconds = max_age_seconds
+        self.offline = offline
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self.path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL
+            )
+            """
+        )
+        self._connection.commit()
+
+    @staticmethod
+    def make_key(base_url: str, endpoint: str, params: Dict[str, Any]) -> str:
+        """
+        Cache key for a request, independent of parameter order. The base
+        URL is part of the key so responses of a stub server never answer
+        requests to the real API sharing the same cache file.
+        """
+        items = sorted(
+            (name, str(value))
+            for name, value in params.items()
+            if name not in IGNORED_PARAMS
+        )
+        return f"{base_url.rstrip('/')}{endpoint}?{urlencode(items)}"
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """Get a stored response, fresh or not."""
+        row = self._connection.execute(
+            "SELECT body, etag, last_modified, fetched_at FROM responses WHERE key = ?",
+            (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        body, etag, last_modified, fetched_at = row
+        return CachedResponse(
+            body=json.loads(zlib.decompress(body)),
+            etag=etag,
+            last_modified=last_modified,
+            fetched_at=fetched_at
+        )
+
+    def put(
+        self,
+        key: str,
+        body: Dict[str, Any],
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None
+    ) -> None:
+        """Store a response."""
+        self._connection.execute(
+            """
+            INSERT OR REPLACE INTO responses (key, body, etag, last_modified, fetched_at)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (
+                key,
+                zlib.compress(json.dumps(body).encode("utf-8")),
+                etag,
+                last_modified,
+                time.time()
+            )
+        )
+        self._connection.commit()
+
+    def touch(self, key: str) -> None:
+        """Mark a stored response as fresh after a successful revalidation."""
+        self._connection.execute(
+            "UPDATE responses SET fetched_at = ? WHERE key = ?",
+            (time.time(), key)
+        )
+        self._connection.commit()
+
+    def close(self) -> None:
+        self._connection.close()
@@ -1,30 +1,166 @@
+import asyncio
+import random
 import httpx
 from typing import List, Dict, Any, Optional
 from app.core.config import get_settings
+from app.services.tmdb_cache import TMDBCacheMiss, TMDBResponseCache
+from app.utils.rate_limit import TokenBucket
 
 settings = get_settings()
 
+# Responses worth retrying: rate limited or transient server errors
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
 
 class TMDBService:
     """Service for interacting with TMDB API."""
     
-    def __init__(self):
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        rate_limiter: Optional[TokenBucket] = None,
+        client: Optional[httpx.AsyncClient] = None,
+        response_cache: Optional[TMDBResponseCache] = None
+    ):
         self.api_key = settings.tmdb_api_key
-        self.base_url = settings.tmdb_base_url
+        self.base_url = base_url or settings.tmdb_base_url
         self.image_base_url = "https://image.tmdb.org/t/p/w780"
+        self.rate_limiter = rate_limiter or TokenBucket(
+            rate=settings.tmdb_requests_per_second,
+            capacity=settings.tmdb_burst
+        )
+        self.max_retries = settings.tmdb_max_retries
+        self._client = client
+        self._owns_client = client is None
+        self.response_cache = response_cache
+    
+    async def __aenter__(self) -> "TMDBService":
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.aclose()
+    
+    def _create_client(self) -> httpx.AsyncClient:
+        """Create the pooled HTTP client shared by all requests."""
+        http2 = settings.tmdb_http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                print("⚠️  h2 is not installed, falling back to HTTP/1.1")
+                http2 = False
         
+        return httpx.AsyncClient(
+            http2=http2,
+            timeout=httpx.Timeout(
+                settings.tmdb_timeout_seconds,
+                connect=settings.tmdb_connect_timeout_seconds
+            ),
+            limits=httpx.Limits(
+                max_connections=settings.tmdb_max_connections,
+                max_keepalive_connections=settings.tmdb_max_keepalive_connections,
+                keepalive_expiry=settings.tmdb_keepalive_expiry_seconds
+            )
+        )
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Long-lived client, created on first use."""
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+            self._owns_client = True
+        return self._client
+    
+    async def aclose(self) -> None:
+        """Close the HTTP client, its pooled connections and the response cache."""
+        if self._client is not None and self._owns_client:
+            await self._client.aclose()
+        self._client = None
+        if self.response_cache is not None:
+            self.response_cache.close()
+            self.response_cache = None
+    
+    def _retry_delay(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        """Backoff before the next attempt, honouring Retry-After when present."""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    return float(retry_after)
+                except ValueError:
+                    pass
+        delay = settings.tmdb_backoff_base_seconds * (2 ** attempt)
+        return delay + random.uniform(0, delay / 2)
+    
     async def _make_request(self, endpoint: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
-        """Make request to TMDB API."""
+        """
+        Make request to TMDB API.
+        Requests are rate limited and retried with backoff on 429/5xx responses
+        and transport errors. With a response cache, fresh entries are served
+        from disk and stale ones are revalidated with ETag/Last-Modified.
+        """
         if params is None:
             params = {}
         
         params["api_key"] = self.api_key
         params["language"] = "fr-FR"  # French language
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{self.base_url}{endpoint}", params=params)
+        # Serve from the on-disk cache when fresh, revalidate when stale
+        cache_key = None
+        cached = None
+        headers = {}
+        if self.response_cache is not None:
+            cache_key = self.response_cache.make_key(self.base_url, endpoint, params)
+            cached = self.response_cache.get(cache_key)
+            if cached is not None and (
+                self.response_cache.offline
+                or cached.is_fresh(self.response_cache.max_age_seconds)
+            ):
+                return cached.body
+            if self.response_cache.offline:
+                raise TMDBCacheMiss(f"Not in TMDB response cache: {cache_key}")
+            if cached is not None:
+                headers = cached.validation_headers()
+        
+        for attempt in range(self.max_retries + 1):
+            await self.rate_limiter.acquire()
+            try:
+                response = await self.client.get(
+                    f"{self.base_url}{endpoint}",
+                    params=params,
+                    headers=headers
+                )
+            except httpx.TransportError:
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(self._retry_delay(attempt))
+                continue
+            
+            if response.status_code in RETRYABLE_STATUS_CODES and attempt < self.max_retries:
+                delay = self._retry_delay(attempt, response)
+                if response.status_code == 429:
+                    # Slow every caller down, not only this one; the next
+                    # acquire() waits out the penalty
+                    self.rate_limiter.penalize(delay)
+                else:
+                    await asyncio.sleep(delay)
+                continue
+            
+            if response.status_code == 304 and cached is not None:
+                self.response_cache.touch(cache_key)
+                return cached.body
+            
             response.raise_for_status()
-            return response.json()
+            body = response.json()
+            
+            if self.response_cache is not None:
+                self.response_cache.put(
+                    cache_key,
+                    body,
+                    etag=response.headers.get("ETag"),
+                    last_modified=response.headers.get("Last-Modified")
+                )
+            return body
     
     async def get_popular_films(
         self, 
@@ -96,9 +232,13 @@ class TMDBService:
     
     async def fetch_complete_film_data(self, tmdb_id: int) -> Dict[str, Any]:
         """Fetch complete film data including details, credits, and keywords."""
-        details = await self.get_film_details(tmdb_id)
-        credits = await self.get_film_credits(tmdb_id)
-        keywords = await self.get_film_keywords(tmdb_id)
+        # One call instead of three: credits and keywords are appended to details
+        details = await self._make_request(
+            f"/movie/{tmdb_id}",
+            {"append_to_response": "credits,keywords"}
+        )
+        credits = details.get("credits", {})
+        keywords = details.get("keywords", {})
         
         # Extract director
         director = None
@@ -1,47 +1,161 @@
+import asyncio
 import json
-from typing import Optional, Any
+import math
+import random
+import struct
+import time
+import uuid
+from typing import Optional, Any, Awaitable, Callable, Dict, Hashable, List, Tuple
+from fastapi import Response
 from app.core.redis import get_redis
 from app.core.config import get_settings
+from app.utils.cache_codec import CacheCodec
+from app.utils.local_cache import MISSING, LocalCache
 
 settings = get_settings()
 
+codec = CacheCodec(
+    settings.cache_serializer,
+    settings.cache_compression,
+    settings.cache_compress_min_bytes
+)
 
-async def get_cached(key: str) -> Optional[Any]:
-    """Get value from cache."""
+# L1 cache in front of Redis, kept coherent across workers via pub/sub
+_local_cache = LocalCache(
+    settings.local_cache_max_entries if settings.local_cache_enabled else 0
+)
+INVALIDATION_CHANNEL = "cache:invalidate"
+_WORKER_ID = uuid.uuid4().hex
+
+# Stored for items a batch computation left out (e.g. unknown ids), and
+# the local cache value of such items
+_ABSENT_MARKER = b"A"
+_ABSENT = object()
+
+# Computations in flight in this process, by cache key
+_inflight: Dict[str, asyncio.Future] = {}
+
+# Move a namespace generation forward only; returns {changed, generation}
+_ADVANCE_GENERATION_SCRIPT = """
+local current = tonumber(redis.call("get", KEYS[1]) or "0")
+local generation = tonumber(ARGV[1])
+if generation > current then
+    redis.call("set", KEYS[1], ARGV[1])
+    return {1, generation}
+end
+return {0, current}
+"""
+
+# Delete a lock only if we still own it
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+async def _publish_invalidation(keys: List[str] = None, pattern: str = None) -> None:
+    """Tell other workers to drop keys from their local cache."""
+    if not settings.local_cache_enabled:
+        return
     try:
         redis = await get_redis()
-        value = await redis.get(key)
-        if value:
-            return json.loads(value)
-        return None
+        await redis.publish(
+            INVALIDATION_CHANNEL,
+            json.dumps({"origin": _WORKER_ID, "keys": keys, "pattern": pattern})
+        )
+    except Exception as e:
+        print(f"Cache invalidation publish error: {e}")
+
+
+async def listen_for_invalidations():
+    """Apply invalidations published by other workers to the local cache."""
+    while True:
+        try:
+            redis = await get_redis()
+            pubsub = redis.pubsub()
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            try:
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    payload = json.loads(message["data"])
+                    if payload["origin"] == _WORKER_ID:
+                        continue
+                    if payload["keys"] is not None:
+                        for key in payload["keys"]:
+                            _local_cache.delete(key)
+                    else:
+                        _local_cache.delete_matching(payload["pattern"])
+            finally:
+                await pubsub.aclose()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Cache invalidation listener error: {e}")
+        
+        # Messages may have been missed while disconnected
+        _local_cache.delete_matching()
+        await asyncio.sleep(1)
+
+
+async def _get_bytes(key: str) -> Optional[bytes]:
+    try:
+        redis = await get_redis()
+        return await redis.get(key)
     except Exception as e:
         print(f"Cache get error: {e}")
         return None
 
 
-async def set_cached(key: str, value: Any, ttl: int = None) -> bool:
-    """Set value in cache with optional TTL."""
+async def _set_bytes(key: str, data: bytes, ttl: int) -> bool:
     try:
         redis = await get_redis()
-        if ttl is None:
-            ttl = settings.cache_ttl_seconds
-        
-        await redis.setex(
-            key,
-            ttl,
-            json.dumps(value)
-        )
+        await redis.setex(key, ttl, data)
+        await _publish_invalidation(keys=[key])
         return True
     except Exception as e:
         print(f"Cache set error: {e}")
         return False
 
 
+async def get_cached(key: str) -> Optional[Any]:
+    """Get value from cache (local cache first, then Redis)."""
+    value = _local_cache.get(key)
+    if value is not MISSING:
+        return value
+    
+    data = await _get_bytes(key)
+    if not data:
+        return None
+    try:
+        value = codec.decode(data)
+    except Exception as e:
+        print(f"Cache decode error: {e}")
+        return None
+    _local_cache.set(key, value, settings.local_cache_ttl_seconds)
+    return value
+
+
+async def set_cached(key: str, value: Any, ttl: int = None) -> bool:
+    """Set value in cache with optional TTL."""
+    if ttl is None:
+        ttl = settings.cache_ttl_seconds
+    
+    if not await _set_bytes(key, codec.encode(value), ttl):
+        return False
+    _local_cache.set(key, value, min(ttl, settings.local_cache_ttl_seconds))
+    return True
+
+
 async def delete_cached(key: str) -> bool:
     """Delete value from cache."""
+    _local_cache.delete(key)
     try:
         redis = await get_redis()
         await redis.delete(key)
+        await _publish_invalidation(keys=[key])
         return True
     except Exception as e:
         print(f"Cache delete error: {e}")
@@ -49,13 +163,532 @@ async def delete_cached(key: str) -> bool:
 
 
 async def clear_cache_pattern(pattern: str) -> int:
-    """Clear all cache keys matching pattern."""
+    """
+    Clear all cache keys matching pattern.
+    
+    Walks the keyspace with SCAN and frees keys with UNLINK in batches so
+    Redis is never blocked. This is still O(keyspace) overall: prefer a
+    namespace (see invalidate_namespace) for keys invalidated as a group.
+    """
+    _local_cache.delete_matching(pattern)
+    await _publish_invalidation(pattern=pattern)
     try:
         redis = await get_redis()
-        keys = await redis.keys(pattern)
-        if keys:
-            return await redis.delete(*keys)
-        return 0
+        deleted = 0
+        batch = []
+        async for key in redis.scan_iter(match=pattern, count=settings.cache_scan_count):
+            batch.append(key)
+            if len(batch) >= settings.cache_scan_count:
+                deleted += await redis.unlink(*batch)
+                batch.clear()
+        if batch:
+            deleted += await redis.unlink(*batch)
+        return deleted
     except Exception as e:
         print(f"Cache clear error: {e}")
         return 0
+
+
+def _namespace_key(namespace: str) -> str:
+    return f"ns:{namespace}"
+
+
+async def _namespace_generation(namespace: str) -> int:
+    generation = _local_cache.get(_namespace_key(namespace))
+    if generation is MISSING:
+        try:
+            redis = await get_redis()
+            generation = int(await redis.get(_namespace_key(namespace)) or 0)
+            _local_cache.set(_namespace_key(namespace), generation, settings.local_cache_ttl_seconds)
+        except Exception as e:
+            print(f"Cache namespace error: {e}")
+            generation = 0
+    return generation
+
+
+async def namespaced_key(namespace: str, key: str) -> str:
+    """
+    Cache key inside a namespace, tagged with the namespace generation.
+    Bumping the generation (invalidate_namespace) orphans every key of the
+    namespace at once; orphaned keys expire with their TTL.
+    """
+    return f"{namespace}:{await _namespace_generation(namespace)}:{key}"
+
+
+async def namespaced_keys(namespace: str, keys: Dict[Hashable, str]) -> Dict[Hashable, str]:
+    """Like namespaced_key for many keys (item -> key), reading the generation once."""
+    generation = await _namespace_generation(namespace)
+    return {item: f"{namespace}:{generation}:{key}" for item, key in keys.items()}
+
+
+async def set_namespace_generation(namespace: str, generation: int) -> bool:
+    """
+    Move a namespace to an external generation (e.g. a catalog version).
+    Generations only move forward, so a worker syncing an older version
+    cannot roll the namespace back; keys of older generations become
+    unreachable. Returns True if the generation changed.
+    """
+    cached = _local_cache.get(_namespace_key(namespace))
+    if cached is not MISSING and cached >= generation:
+        return False
+    try:
+        redis = await get_redis()
+        changed, current = await redis.eval(
+            _ADVANCE_GENERATION_SCRIPT, 1, _namespace_key(namespace), generation
+        )
+        _local_cache.set(_namespace_key(namespace), int(current), settings.local_cache_ttl_seconds)
+        if changed:
+            await _publish_invalidation(keys=[_namespace_key(namespace)])
+        return bool(changed)
+    except Exception as e:
+        print(f"Cache namespace error: {e}")
+        return False
+
+
+async def invalidate_namespace(namespace: str) -> bool:
+    """Invalidate every key of a namespace in O(1)."""
+    _local_cache.delete(_namespace_key(namespace))
+    try:
+        redis = await get_redis()
+        await redis.incr(_namespace_key(namespace))
+        await _publish_invalidation(keys=[_namespace_key(namespace)])
+        return True
+    except Exception as e:
+        print(f"Cache namespace error: {e}")
+        return False
+
+
+def _lock_key(key: str) -> str:
+    return f"lock:{key}"
+
+
+async def _acquire_lock(key: str) -> Optional[str]:
+    """Take the cross-worker recompute lock of a key; returns its token, or None if held."""
+    token = uuid.uuid4().hex
+    try:
+        redis = await get_redis()
+        acquired = await redis.set(
+            _lock_key(key),
+            token,
+            nx=True,
+            px=int(settings.cache_lock_timeout_seconds * 1000)
+        )
+        return token if acquired else None
+    except Exception as e:
+        print(f"Cache lock error: {e}")
+        return token  # Redis down: compute without coordination
+
+
+async def _lock_held(key: str) -> bool:
+    """Check whether a worker holds the recompute lock of a key."""
+    try:
+        redis = await get_redis()
+        return bool(await redis.exists(_lock_key(key)))
+    except Exception as e:
+        print(f"Cache lock error: {e}")
+        return False
+
+
+async def _release_lock(key: str, token: str) -> None:
+    try:
+        redis = await get_redis()
+        await redis.eval(_RELEASE_LOCK_SCRIPT, 1, _lock_key(key), token)
+    except Exception as e:
+        print(f"Cache unlock error: {e}")
+
+
+class CacheEntry:
+    """
+    A computed value with its soft expiry and compute time.
+    
+    The value is kept encoded and decoded lazily, so serving an entry as
+    a JSON response usually needs no parsing at all.
+    """
+    
+    # Prefix of stored entries: marker, expires_at, delta
+    HEADER = struct.Struct("!cdd")
+    MARKER = b"E"
+    
+    def __init__(self, data: bytes, expires_at: float, delta: float, value: Any = MISSING):
+        self.data = data
+        self.expires_at = expires_at
+        self.delta = delta
+        self._value = value
+        self._json_body = None
+    
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> "CacheEntry":
+        marker, expires_at, delta = cls.HEADER.unpack_from(raw)
+        if marker != cls.MARKER:
+            raise ValueError("Not a cache entry")
+        return cls(raw[cls.HEADER.size:], expires_at, delta)
+    
+    def to_bytes(self) -> bytes:
+        return self.HEADER.pack(self.MARKER, self.expires_at, self.delta) + self.data
+    
+    @property
+    def value(self) -> Any:
+        if self._value is MISSING:
+            self._value = codec.decode(self.data)
+        return self._value
+    
+    @property
+    def json_body(self) -> bytes:
+        if self._json_body is None:
+            self._json_body = codec.decode_json(self.data)
+        return self._json_body
+    
+    def should_refresh(self) -> bool:
+        """
+        Probabilistic early expiration (XFetch): the closer the entry is to
+        its expiry, and the longer it took to compute, the likelier one
+        request refreshes it ahead of time. Always True once stale.
+        """
+        jitter = -self.delta * settings.cache_early_refresh_beta * math.log(1.0 - random.random())
+        return time.time() + jitter >= self.expires_at
+
+
+async def _get_entry(key: str) -> Optional[CacheEntry]:
+    """Get a cache entry written by get_or_compute_cached."""
+    entry = _local_cache.get(key)
+    if isinstance(entry, CacheEntry):
+        return entry
+    
+    raw = await _get_bytes(key)
+    if not raw:
+        return None
+    try:
+        entry = CacheEntry.from_bytes(raw)
+    except Exception:
+        return None  # Written in another format: treat as a miss
+    _local_cache.set(key, entry, settings.local_cache_ttl_seconds)
+    return entry
+
+
+async def _compute_and_store(
+    key: str,
+    compute: Callable[[], Awaitable[Any]],
+    ttl: int
+) -> CacheEntry:
+    """Run ``compute`` and cache its result."""
+    started_at = time.monotonic()
+    value = await compute()
+    entry = CacheEntry(
+        codec.encode(value),
+        expires_at=time.time() + ttl,
+        delta=time.monotonic() - started_at,
+        value=value
+    )
+    
+    # Serve the entry stale for a grace period while it is refreshed
+    ttl += settings.cache_stale_seconds
+    if await _set_bytes(key, entry.to_bytes(), ttl):
+        _local_cache.set(key, entry, min(ttl, settings.local_cache_ttl_seconds))
+    return entry
+
+
+async def _wait_for_entry(key: str, deadline: float) -> Optional[CacheEntry]:
+    """
+    Wait for another worker holding the lock to fill a key. Returns None
+    if the lock is released without a value (its compute failed) or
+    ``deadline`` passes.
+    """
+    while time.monotonic() < deadline:
+        await asyncio.sleep(settings.cache_lock_poll_seconds)
+        entry = await _get_entry(key)
+        if entry:
+            return entry
+        if not await _lock_held(key):
+            # The value may have landed just before the lock was released
+            return await _get_entry(key)
+    return None
+
+
+async def _fill_entry(
+    key: str,
+    compute: Callable[[], Awaitable[Any]],
+    ttl: int,
+    stale: Optional[CacheEntry],
+    future: asyncio.Future
+) -> CacheEntry:
+    """
+    Fill a key once for this process, resolving ``future`` (registered
+    in _inflight by the caller) for the callers that joined it.
+    """
+    token = None
+    try:
+        entry = None
+        deadline = time.monotonic() + settings.cache_lock_timeout_seconds
+        while (token := await _acquire_lock(key)) is None:
+            # Another worker is computing the key
+            entry = stale or await _wait_for_entry(key, deadline)
+            if entry or time.monotonic() >= deadline:
+                break
+        if entry is None:
+            entry = await _compute_and_store(key, compute, ttl)
+        future.set_result(entry)
+        return entry
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # Mark retrieved when nobody is waiting
+        raise
+    finally:
+        if _inflight.get(key) is future:
+            del _inflight[key]
+        if token:
+            await _release_lock(key, token)
+
+
+async def _get_or_compute_entry(
+    key: str,
+    compute: Callable[[], Awaitable[Any]],
+    ttl: int = None
+) -> CacheEntry:
+    if ttl is None:
+        ttl = settings.cache_ttl_seconds
+    
+    entry = await _get_entry(key)
+    if entry and not entry.should_refresh():
+        return entry
+    
+    # Someone in this process is already computing the key
+    if key in _inflight:
+        if entry:
+            return entry
+        joined = await asyncio.shield(_inflight[key])
+        if joined is not None:
+            return joined
+        # A batch fill left the key out: compute it here
+    
+    # Registered before any await, so concurrent callers join this fill
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    return await _fill_entry(key, compute, ttl, entry, future)
+
+
+async def get_or_compute_cached(
+    key: str,
+    compute: Callable[[], Awaitable[Any]],
+    ttl: int = None
+) -> Any:
+    """
+    Read-through cache with stampede protection.
+    
+    Concurrent misses on a key run ``compute`` once: callers in this
+    process share one future, and a Redis lock makes other workers wait
+    for the value instead of recomputing it. Entries are refreshed early
+    with a probability that grows near expiry, and are then served stale
+    for ``cache_stale_seconds`` while a single caller recomputes them.
+    ``compute`` must return a value the cache codec can serialize.
+    """
+    return (await _get_or_compute_entry(key, compute, ttl)).value
+
+
+async def cached_json_response(
+    key: str,
+    compute: Callable[[], Awaitable[Any]],
+    ttl: int = None
+) -> Response:
+    """
+    Like get_or_compute_cached, but returns the value as a JSON response.
+    Hits send the stored bytes as-is, skipping decoding, response_model
+    validation and re-serialization, so ``compute`` must return data
+    already shaped like the route's response model.
+    """
+    entry = await _get_or_compute_entry(key, compute, ttl)
+    return Response(content=entry.json_body, media_type="application/json")
+
+
+async def _read_entries(keys: Dict[Hashable, str]) -> Tuple[Dict, Dict, set]:
+    """
+    Cached entries of many keys (item -> cache key): local cache first,
+    then one Redis MGET. Returns (entries, stale, absent): entries to
+    serve, entries due for refresh, and items cached as absent.
+    """
+    entries, stale, absent = {}, {}, set()
+    remote = []
+    for item, key in keys.items():
+        entry = _local_cache.get(key)
+        if entry is _ABSENT:
+            absent.add(item)
+        elif isinstance(entry, CacheEntry) and not entry.should_refresh():
+            entries[item] = entry
+        else:
+            remote.append(item)
+    
+    if remote:
+        try:
+            redis = await get_redis()
+            raw_values = await redis.mget([keys[item] for item in remote])
+        except Exception as e:
+            print(f"Cache get error: {e}")
+            raw_values = [None] * len(remote)
+        
+        for item, raw in zip(remote, raw_values):
+            if not raw:
+                continue
+            if raw == _ABSENT_MARKER:
+                absent.add(item)
+                _local_cache.set(keys[item], _ABSENT, settings.local_cache_ttl_seconds)
+                continue
+            try:
+                entry = CacheEntry.from_bytes(raw)
+            except Exception:
+                continue
+            _local_cache.set(keys[item], entry, settings.local_cache_ttl_seconds)
+            if entry.should_refresh():
+                stale[item] = entry
+            else:
+                entries[item] = entry
+    
+    return entries, stale, absent
+
+
+async def _store_many(entries: Dict[str, CacheEntry], absent: List[str], ttl: int) -> None:
+    """Write computed entries and absent markers in one pipeline."""
+    ttl += settings.cache_stale_seconds
+    absent_ttl = settings.cache_absent_ttl_seconds
+    try:
+        redis = await get_redis()
+        async with redis.pipeline(transaction=False) as pipe:
+            for key, entry in entries.items():
+                pipe.setex(key, ttl, entry.to_bytes())
+            for key in absent:
+                pipe.setex(key, absent_ttl, _ABSENT_MARKER)
+            await pipe.execute()
+        await _publish_invalidation(keys=[*entries, *absent])
+    except Exception as e:
+        print(f"Cache set error: {e}")
+        return
+    
+    for key, entry in entries.items():
+        _local_cache.set(key, entry, min(ttl, settings.local_cache_ttl_seconds))
+    for key in absent:
+        _local_cache.set(key, _ABSENT, min(absent_ttl, settings.local_cache_ttl_seconds))
+
+
+async def _compute_many(
+    keys: Dict[Hashable, str],
+    items: List[Hashable],
+    compute_missing: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]],
+    ttl: int
+) -> Dict[Hashable, CacheEntry]:
+    """Run ``compute_missing`` once for ``items`` and cache the results."""
+    started_at = time.monotonic()
+    values = await compute_missing(items)
+    delta = time.monotonic() - started_at
+    
+    computed = {
+        item: CacheEntry(
+            codec.encode(values[item]),
+            expires_at=time.time() + ttl,
+            delta=delta,
+            value=values[item]
+        )
+        for item in items if item in values
+    }
+    await _store_many(
+        {keys[item]: entry for item, entry in computed.items()},
+        [keys[item] for item in items if item not in computed],
+        ttl
+    )
+    return computed
+
+
+async def get_or_compute_many(
+    keys: Dict[Hashable, str],
+    compute_missing: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]],
+    ttl: int = None
+) -> Dict[Hashable, CacheEntry]:
+    """
+    Batched read-through cache over ``keys`` (item -> cache key), with the
+    stampede protection of get_or_compute_cached applied per key.
+    
+    Hits come from the local cache, then from one Redis MGET. Items being
+    filled elsewhere in this process are joined. The others are locked
+    across workers: items locked by another worker are served stale if
+    possible, else waited for. Everything this call fills is computed by
+    a single ``compute_missing(items)`` call and written back in one
+    pipeline. Items ``compute_missing`` leaves out (e.g. unknown ids) are
+    cached as absent for ``cache_absent_ttl_seconds`` and omitted from the
+    result. Entries are shared with get_or_compute_cached on the same keys
+    (which treats absent markers as misses).
+    """
+    if ttl is None:
+        ttl = settings.cache_ttl_seconds
+    
+    entries, stale, absent = await _read_entries(keys)
+    todo = [item for item in keys if item not in entries and item not in absent]
+    if not todo:
+        return entries
+    
+    # Join fills running in this process; register ours before any await
+    joined: Dict[Hashable, asyncio.Future] = {}
+    futures: Dict[Hashable, asyncio.Future] = {}
+    loop = asyncio.get_running_loop()
+    for item in todo:
+        key = keys[item]
+        if key in _inflight:
+            if item in stale:
+                entries[item] = stale[item]
+            else:
+                joined[item] = _inflight[key]
+        else:
+            futures[item] = _inflight[key] = loop.create_future()
+    
+    tokens: Dict[Hashable, str] = {}
+    try:
+        acquired = await asyncio.gather(*(_acquire_lock(keys[item]) for item in futures))
+        tokens = {item: token for item, token in zip(futures, acquired) if token}
+        
+        # Other workers are computing the rest
+        filled: Dict[Hashable, CacheEntry] = {}
+        waiting = []
+        for item in futures:
+            if item not in tokens:
+                if item in stale:
+                    filled[item] = stale[item]
+                else:
+                    waiting.append(item)
+        
+        if tokens:
+            filled.update(await _compute_many(keys, list(tokens), compute_missing, ttl))
+        
+        deadline = time.monotonic() + settings.cache_lock_timeout_seconds
+        waited = await asyncio.gather(
+            *(_wait_for_entry(keys[item], deadline) for item in waiting),
+            *(asyncio.shield(future) for future in joined.values()),
+            return_exceptions=True
+        )
+        for item, entry in zip(waiting + list(joined), waited):
+            if isinstance(entry, CacheEntry):
+                filled[item] = entry
+        
+        # Fills that failed, timed out or left items out: compute them once
+        leftover = [item for item in waiting + list(joined) if item not in filled]
+        if leftover:
+            filled.update(await _compute_many(keys, leftover, compute_missing, ttl))
+        
+        for item, future in futures.items():
+            future.set_result(filled.get(item))
+        entries.update(filled)
+        return entries
+    except asyncio.CancelledError:
+        for future in futures.values():
+            future.cancel()
+        raise
+    except Exception as e:
+        for future in futures.values():
+            if not future.done():
+                future.set_exception(e)
+                future.exception()  # Mark retrieved when nobody is waiting
+        raise
+    finally:
+        for item, future in futures.items():
+            if _inflight.get(keys[item]) is future:
+                del _inflight[keys[item]]
+        for item, token in tokens.items():
+            await _release_lock(keys[item], token)
@@ -0,0 +1,146 @@
+import json
+import zlib
+from typing import Any, Callable, Dict, List, Tuple
+
+# Serializers and compressors are tagged in a one-byte header
+# (serializer << 4 | compressor), so values written with another
+# configuration stay readable and unknown payloads read as misses.
+JSON = 1
+ORJSON = 2
+MSGPACK = 3
+
+NONE = 0
+ZLIB = 1
+ZSTD = 2
+LZ4 = 3
+
+# Serializers whose payload already is a JSON document
+JSON_SERIALIZERS = {JSON, ORJSON}
+
+
+class CacheCodecError(ValueError):
+    """Raised when a cached payload cannot be decoded."""
+
+
+def _json_dumps(value: Any) -> bytes:
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+_serializers: Dict[int, Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]] = {
+    JSON: (_json_dumps, json.loads),
+}
+_compressors: Dict[int, Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {
+    ZLIB: (zlib.compress, zlib.decompress),
+}
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+else:
+    _serializers[ORJSON] = (orjson.dumps, orjson.loads)
+    # orjson parses any JSON payload faster than the json module
+    _serializers[JSON] = (_json_dumps, orjson.loads)
+
+try:
+    import msgpack
+except ImportError:
+    pass
+else:
+    _serializers[MSGPACK] = (msgpack.packb, msgpack.unpackb)
+
+try:
+    import zstandard
+except ImportError:
+    pass
+else:
+    _compressors[ZSTD] = (
+        zstandard.ZstdCompressor(level=3).compress,
+        zstandard.ZstdDecompressor().decompress
+    )
+
+try:
+    import lz4.frame
+except ImportError:
+    pass
+else:
+    _compressors[LZ4] = (lz4.frame.compress, lz4.frame.decompress)
+
+SERIALIZERS = {"json": JSON, "orjson": ORJSON, "msgpack": MSGPACK}
+COMPRESSORS = {"none": NONE, "zlib": ZLIB, "zstd": ZSTD, "lz4": LZ4}
+
+
+def dumps_json(value: Any) -> bytes:
+    """Serialize a value to a JSON document, with orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return _json_dumps(value)
+
+
+def join_json_array(documents: List[bytes]) -> bytes:
+    """JSON array of already serialized documents."""
+    return b"[" + b",".join(documents) + b"]"
+
+
+def join_json_object(documents: Dict[Any, bytes]) -> bytes:
+    """JSON object of already serialized documents (keys are stringified)."""
+    return b"{" + b",".join(
+        dumps_json(str(key)) + b":" + document
+        for key, document in documents.items()
+    ) + b"}"
+
+
+class CacheCodec:
+    """
+    Serializes cache values, compressing those of at least
+    ``compress_min_bytes`` bytes. Requested libraries that are not
+    installed fall back to json and zlib.
+    """
+
+    def __init__(self, serializer: str, compressor: str, compress_min_bytes: int):
+        self.serializer = SERIALIZERS[serializer]
+        if self.serializer not in _serializers:
+            print(f"⚠️  {serializer} is not installed, caching with json")
+            self.serializer = JSON
+
+        self.compressor = COMPRESSORS[compressor]
+        if self.compressor != NONE and self.compressor not in _compressors:
+            print(f"⚠️  {compressor} is not installed, compressing cache values with zlib")
+            self.compressor = ZLIB
+
+        self.compress_min_bytes = compress_min_bytes
+
+    def encode(self, value: Any) -> bytes:
+        payload = _serializers[self.serializer][0](value)
+        compressor = NONE
+        if self.compressor != NONE and len(payload) >= self.compress_min_bytes:
+            compressor = self.compressor
+            payload = _compressors[compressor][0](payload)
+        return bytes([self.serializer << 4 | compressor]) + payload
+
+    @staticmethod
+    def _unpack(data: bytes) -> Tuple[int, bytes]:
+        """Serializer and uncompressed payload of encoded data."""
+        if not data:
+            raise CacheCodecError("Empty cache payload")
+        serializer, compressor = data[0] >> 4, data[0] & 0x0F
+        if serializer not in _serializers or (
+            compressor != NONE and compressor not in _compressors
+        ):
+            raise CacheCodecError(f"Unknown cache payload format {data[0]:#04x}")
+
+        payload = data[1:]
+        if compressor != NONE:
+            payload = _compressors[compressor][1](payload)
+        return serializer, payload
+
+    def decode(self, data: bytes) -> Any:
+        serializer, payload = self._unpack(data)
+        return _serializers[serializer][1](payload)
+
+    def decode_json(self, data: bytes) -> bytes:
+        """Decoded value as a JSON document, without parsing it when possible."""
+        serializer, payload = self._unpack(data)
+        if serializer in JSON_SERIALIZERS:
+            return payload
+        return dumps_json(_serializers[serializer][1](payload))
@@ -0,0 +1,57 @@
+import time
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+from typing import Any, Optional, Tuple
+
+# Marker for a miss, since None can be a cached value
+MISSING = object()
+
+
+class LocalCache:
+    """
+    Size-bounded, in-process LRU cache with a TTL per entry.
+
+    Values are returned as stored (not copied), so callers must treat
+    them as read-only.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Any:
+        """Get a live value, or MISSING."""
+        item = self._entries.get(key)
+        if item is None:
+            return MISSING
+
+        expires_at, value = item
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            return MISSING
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        """Store a value for ``ttl`` seconds, evicting the least recently used entries."""
+        if self.max_entries <= 0 or ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def delete_matching(self, pattern: Optional[str] = None) -> None:
+        """Delete keys matching a glob pattern (Redis KEYS syntax), or all keys."""
+        if pattern is None:
+            self._entries.clear()
+            return
+        for key in [key for key in self._entries if fnmatchcase(key, pattern)]:
+            del self._entries[key]
@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Async token-bucket rate limiter.
+
+    Tokens refill continuously at ``rate`` per second up to ``capacity``;
+    each ``acquire`` takes one token, waiting until one is available.
+    """
+
+    def __init__(self, rate: float, capacity: int = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity,
+            self._tokens + (now - self._updated_at) * self.rate
+        )
+        self._updated_at = now
+
+    async def acquire(self) -> None:
+        """Wait for and consume one token."""
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def penalize(self, seconds: float) -> None:
+        """
+        Drain the bucket so no request is sent for ``seconds`` (e.g. after a
+        429). Idempotent: concurrent penalties overlap instead of adding up.
+        """
+        self._refill()
+        self._tokens = min(self._tokens, -seconds * self.rate)
@@ -0,0 +1,163 @@
+"""
+Benchmark the approximate (LSH) similarity backend against exact top-N.
+
+Scores a sample of films with both backends and reports, for every
+combination of LSH parameters, the recall of the exact neighbours and the
+build/query times extrapolated to the whole catalog:
+
+    python scripts/benchmark_ann.py --tables 4 8 16 --bits 10 12 14
+    python scripts/benchmark_ann.py --synthetic 200000 --queries 2000
+"""
+import argparse
+import sys
+import time
+from itertools import product
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import numpy as np
+from scipy import sparse
+from app.core.config import get_settings
+from app.services.ann_search import LSHIndex, reduce_dimensions
+from app.services.feature_store import FeatureStore
+from app.services.film_features import FilmFeaturizer, combine_blocks
+from app.services.similarity_search import iter_top_k
+
+settings = get_settings()
+
+
+def load_feature_matrix(path: str) -> sparse.csr_matrix:
+    """Weighted film vectors of a saved feature store."""
+    store = FeatureStore(path)
+    if not store.exists():
+        raise SystemExit(
+            f"❌ No feature store in {path}: run scripts/populate_db.py or use --synthetic"
+        )
+    blocks, _, _, weights = store.load(FilmFeaturizer())
+    return combine_blocks(blocks, weights)
+
+
+def synthetic_matrix(n_films: int, n_terms: int = 50000, seed: int = 0) -> sparse.csr_matrix:
+    """
+    Random sparse film vectors with nested structure, like genres and
+    franchises: films come in small groups sharing most of their terms,
+    groups belong to topics sharing a vocabulary, plus random noise terms.
+    """
+    rng = np.random.default_rng(seed)
+    n_groups = max(1, n_films // 20)
+    n_topics = max(1, n_films // 500)
+
+    topic_terms = rng.integers(0, n_terms, (n_topics, 300))
+    group_topics = rng.integers(0, n_topics, n_groups)
+    group_terms = topic_terms[group_topics[:, None], rng.integers(0, 300, (n_groups, 30))]
+    groups = rng.integers(0, n_groups, n_films)
+
+    columns = np.concatenate([
+        group_terms[groups[:, None], rng.integers(0, 30, (n_films, 15))],
+        topic_terms[group_topics[groups][:, None], rng.integers(0, 300, (n_films, 15))],
+        rng.integers(0, n_terms, (n_films, 10)),
+    ], axis=1)
+    rows = np.repeat(np.arange(n_films), columns.shape[1])
+    matrix = sparse.csr_matrix(
+        (rng.random(columns.size).astype(np.float32), (rows, columns.ravel())),
+        shape=(n_films, n_terms)
+    )
+    matrix.sum_duplicates()
+    return matrix
+
+
+def exact_neighbours(matrix: sparse.csr_matrix, positions: np.ndarray, top_n: int, memory_budget_mb: int) -> list:
+    """Exact neighbours of the films at ``positions``, above the minimum score."""
+    neighbours = [set() for _ in positions]
+    for i, indices, scores in iter_top_k(
+        matrix[positions], matrix, top_n=top_n,
+        memory_budget_mb=memory_budget_mb, self_indices=positions
+    ):
+        neighbours[i] = set(indices[scores > settings.similarity_min_score].tolist())
+    return neighbours
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Benchmark LSH similarity recall against exact top-N.")
+    parser.add_argument(
+        "--feature-store",
+        default=settings.feature_store_dir,
+        help="Feature store to read the film vectors from"
+    )
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        default=None,
+        help="Benchmark on this many synthetic films instead of the feature store"
+    )
+    parser.add_argument("--queries", type=int, default=1000, help="Number of sampled query films")
+    parser.add_argument("--top-n", type=int, default=settings.similarity_top_n)
+    parser.add_argument("--components", type=int, nargs="+", default=[settings.ann_components])
+    parser.add_argument("--tables", type=int, nargs="+", default=[settings.ann_tables])
+    parser.add_argument("--bits", type=int, nargs="+", default=[settings.ann_bits])
+    parser.add_argument("--max-bucket", type=int, nargs="+", default=[settings.ann_max_bucket])
+    parser.add_argument("--memory-budget-mb", type=int, default=settings.similarity_memory_budget_mb)
+    parser.add_argument("--seed", type=int, default=settings.ann_seed)
+    return parser.parse_args()
+
+
+def main():
+    """Run the benchmark grid."""
+    args = parse_args()
+
+    print("📏 Similarity backend benchmark")
+    print("=" * 50)
+
+    if args.synthetic:
+        matrix = synthetic_matrix(args.synthetic, seed=args.seed)
+    else:
+        matrix = load_feature_matrix(args.feature_store)
+    n_films = matrix.shape[0]
+
+    rng = np.random.default_rng(args.seed)
+    positions = np.sort(rng.choice(n_films, size=min(args.queries, n_films), replace=False))
+    scale = n_films / len(positions)
+    print(f"   {n_films} films, {matrix.shape[1]} terms, {len(positions)} sampled queries")
+
+    start = time.perf_counter()
+    exact = exact_neighbours(matrix, positions, args.top_n, args.memory_budget_mb)
+    exact_seconds = (time.perf_counter() - start) * scale
+    n_exact = sum(len(neighbours) for neighbours in exact)
+    print(f"✅ Exact: ~{exact_seconds:.1f}s for the full catalog")
+
+    print()
+    print(f"{'dims':>5} {'tables':>6} {'bits':>4} {'bucket':>6} {'recall':>7} "
+          f"{'build s':>8} {'full s':>8} {'speedup':>7}")
+
+    for n_components in args.components:
+        start = time.perf_counter()
+        embeddings = reduce_dimensions(matrix, n_components, args.seed)
+        reduce_seconds = time.perf_counter() - start
+
+        for n_tables, n_bits, max_bucket in product(args.tables, args.bits, args.max_bucket):
+            start = time.perf_counter()
+            index = LSHIndex(matrix, embeddings, n_tables=n_tables, n_bits=n_bits, seed=args.seed)
+            build_seconds = reduce_seconds + time.perf_counter() - start
+
+            start = time.perf_counter()
+            found = 0
+            for i, indices, scores in index.iter_top_k(
+                args.top_n,
+                positions=positions,
+                max_bucket=max_bucket,
+                memory_budget_mb=args.memory_budget_mb
+            ):
+                found += len(exact[i].intersection(indices.tolist()))
+            full_seconds = build_seconds + (time.perf_counter() - start) * scale
+
+            recall = found / n_exact if n_exact else 1.0
+            print(f"{embeddings.shape[1]:>5} {n_tables:>6} {index.n_bits:>4} {max_bucket:>6} "
+                  f"{recall:>7.3f} {build_seconds:>8.1f} {full_seconds:>8.1f} "
+                  f"{exact_seconds / full_seconds:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
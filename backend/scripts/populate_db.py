@@ -1,120 +1,281 @@
 """
 Script to populate database with films from TMDB and compute similarities.
 """
+import argparse
 import asyncio
 import sys
+from contextlib import suppress
 from pathlib import Path
+from typing import Any, Dict, List, Tuple
 
 # Add parent directory to path
 sys.path.append(str(Path(__file__).parent.parent))
 
 from sqlalchemy.orm import Session
+from app.core.config import get_settings
 from app.core.database import SessionLocal, engine, Base
-from app.models.film import Film
+from app.models.catalog import CatalogVersion
+from app.models.film import upgrade_schema
+from app.services.film_facets import facets_missing, rebuild_facets
+from app.services.film_store import upsert_films
+from app.services.tmdb_cache import TMDBResponseCache
 from app.services.tmdb_service import TMDBService
 from app.services.recommendation_engine import RecommendationEngine
 
+settings = get_settings()
+
+
+def store_films(db: Session, films: List[Dict[str, Any]]) -> Tuple[int, int]:
+    """
+    Upsert a batch of films. If the batch fails (e.g. one invalid record),
+    retry it film by film and skip the films that still fail.
+    Returns (films_added, films_updated).
+    """
+    try:
+        return upsert_films(db, films)
+    except Exception as e:
+        print(f"  ⚠️  Error storing a batch of {len(films)} films, retrying one by one: {e}")
+    
+    films_added = 0
+    films_updated = 0
+    for film in films:
+        try:
+            added, updated = upsert_films(db, [film])
+        except Exception as e:
+            print(f"  ⚠️  Skipping film {film.get('tmdb_id')}: {e}")
+            continue
+        films_added += added
+        films_updated += updated
+    return films_added, films_updated
+
+
+def drop_tables():
+    """
+    Drop every table except catalog_versions before a full populate.
+    Versions must stay monotonic: a rebuild that restarted them could land
+    on the version a running server already loaded, which would miss it.
+    """
+    Base.metadata.drop_all(
+        bind=engine,
+        tables=[
+            table for table in Base.metadata.sorted_tables
+            if table is not CatalogVersion.__table__
+        ]
+    )
+
 
 async def fetch_and_store_films(
     db: Session,
     tmdb_service: TMDBService,
-    num_pages: int = 50
+    num_pages: int = 50,
+    concurrency: int = None,
+    batch_size: int = None
 ):
-    """Fetch films from TMDB and store in database."""
-    print(f"📥 Fetching films from TMDB ({num_pages} pages)...")
+    """
+    Fetch films from TMDB and store in database.
+    
+    Pages and film details are fetched by a bounded pool of concurrent
+    workers; TMDBService applies the rate limit and retries. Films are
+    upserted in batches of ``batch_size`` while the crawl continues.
+    """
+    if concurrency is None:
+        concurrency = settings.tmdb_max_concurrency
+    if batch_size is None:
+        batch_size = settings.ingest_batch_size
+    
+    print(f"📥 Fetching films from TMDB ({num_pages} pages, {concurrency} workers)...")
     
     films_added = 0
     films_updated = 0
     
-    for page in range(1, num_pages + 1):
-        try:
-            # Get popular films
-            response = await tmdb_service.get_popular_films(page=page)
+    film_ids: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 4)
+    results: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 4)
+    seen_ids = set()
+    pages = iter(range(1, num_pages + 1))
+    
+    async def fetch_pages():
+        """Queue the film ids of each popular page."""
+        for page in pages:
+            try:
+                response = await tmdb_service.get_popular_films(page=page)
+            except Exception as e:
+                print(f"  ⚠️  Error fetching page {page}: {e}")
+                continue
             
             for film_data in response.get("results", []):
                 tmdb_id = film_data.get("id")
-                
-                # Check if film already exists
-                existing_film = db.query(Film).filter(Film.tmdb_id == tmdb_id).first()
-                
-                # Fetch complete data
-                try:
-                    complete_data = await tmdb_service.fetch_complete_film_data(tmdb_id)
-                    
-                    if existing_film:
-                        # Update existing film
-                        for key, value in complete_data.items():
-                            if key != "tmdb_id":  # Don't update tmdb_id
-                                setattr(existing_film, key, value)
-                        films_updated += 1
-                    else:
-                        # Create new film
-                        film = Film(**complete_data)
-                        db.add(film)
-                        films_added += 1
-                    
-                    # Commit every 10 films
-                    if (films_added + films_updated) % 10 == 0:
-                        db.commit()
-                        print(f"  Progress: {films_added} added, {films_updated} updated")
-                
-                except Exception as e:
-                    print(f"  ⚠️  Error fetching film {tmdb_id}: {e}")
+                # Popular lists shift while crawling; fetch each film once
+                if tmdb_id in seen_ids:
                     continue
-            
-            # Small delay to respect rate limits
-            await asyncio.sleep(0.3)
-            
-        except Exception as e:
-            print(f"  ⚠️  Error fetching page {page}: {e}")
-            continue
+                seen_ids.add(tmdb_id)
+                await film_ids.put(tmdb_id)
     
-    # Final commit
-    db.commit()
+    async def fetch_films():
+        """Fetch complete data for queued film ids."""
+        while (tmdb_id := await film_ids.get()) is not None:
+            try:
+                await results.put(await tmdb_service.fetch_complete_film_data(tmdb_id))
+            except Exception as e:
+                print(f"  ⚠️  Error fetching film {tmdb_id}: {e}")
+    
+    async def crawl():
+        page_workers = [fetch_pages() for _ in range(min(concurrency, num_pages))]
+        film_workers = [asyncio.create_task(fetch_films()) for _ in range(concurrency)]
+        cancelled = False
+        try:
+            await asyncio.gather(*page_workers)
+            for _ in film_workers:
+                await film_ids.put(None)
+            await asyncio.gather(*film_workers)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            for worker in film_workers:
+                worker.cancel()
+            # Signal the end of the crawl, unless the consumer stopped it
+            if not cancelled:
+                await results.put(None)
+    
+    crawler = asyncio.create_task(crawl())
+    batch = []
+    
+    async def flush():
+        nonlocal films_added, films_updated
+        added, updated = await asyncio.to_thread(store_films, db, batch)
+        films_added += added
+        films_updated += updated
+        batch.clear()
+        print(f"  Progress: {films_added} added, {films_updated} updated")
+    
+    try:
+        # Upsert films in large batches while the crawl continues
+        while (complete_data := await results.get()) is not None:
+            batch.append(complete_data)
+            if len(batch) >= batch_size:
+                await flush()
+        
+        await crawler
+        
+        # Final batch
+        if batch:
+            await flush()
+    finally:
+        # Don't leave the crawl running if storing failed
+        if not crawler.done():
+            crawler.cancel()
+            with suppress(asyncio.CancelledError):
+                await crawler
     
     print(f"✅ Films fetched: {films_added} added, {films_updated} updated")
     return films_added, films_updated
 
 
-def compute_and_store_similarities(db: Session):
+def compute_and_store_similarities(db: Session, incremental: bool = False):
     """Compute similarities between films."""
-    print("🔄 Computing film similarities...")
-    
     engine = RecommendationEngine()
-    similarities_created = engine.compute_similarities(db)
+    
+    if incremental:
+        print("🔄 Updating film similarities incrementally...")
+        similarities_created = engine.update_similarities(db)
+    else:
+        print("🔄 Computing film similarities...")
+        similarities_created = engine.compute_similarities(db)
     
     print(f"✅ Similarities computed: {similarities_created} pairs created")
     return similarities_created
 
 
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Populate the films database from TMDB.")
+    parser.add_argument(
+        "--pages",
+        type=int,
+        default=20,  # Fetch 20 pages (400 films) for faster startup
+        help="Number of TMDB popular pages to fetch"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=settings.tmdb_max_concurrency,
+        help="Number of concurrent TMDB workers"
+    )
+    parser.add_argument(
+        "--tmdb-base-url",
+        default=None,
+        help="TMDB API base URL (e.g. a local stub server)"
+    )
+    parser.add_argument(
+        "--no-tmdb-cache",
+        action="store_true",
+        help="Always fetch from TMDB, bypassing the on-disk response cache"
+    )
+    parser.add_argument(
+        "--tmdb-cache-offline",
+        action="store_true",
+        help="Serve TMDB responses only from the on-disk cache, without network"
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Keep existing tables and only recompute similarities of new or changed films"
+    )
+    return parser.parse_args()
+
+
 async def main():
     """Main function to populate database."""
+    args = parse_args()
+    
     print("🎬 Movie Recommender - Database Population")
     print("=" * 50)
     
     # Create tables
     print("📊 Creating database tables...")
-    Base.metadata.drop_all(bind=engine)  # Drop existing tables to update schema
+    if not args.incremental:
+        drop_tables()  # Drop existing tables to update schema
     Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        upgrade_schema(connection)
     print("✅ Tables created")
     
     # Create database session
     db = SessionLocal()
     
     try:
-        # Initialize TMDB service
-        tmdb_service = TMDBService()
+        # Databases created before facet counts existed need a first full count
+        if facets_missing(db):
+            print("🔄 Counting film facets...")
+            rebuild_facets(db)
+        
+        # Initialize TMDB service (one pooled HTTP client for the whole crawl)
+        response_cache = None
+        if not args.no_tmdb_cache:
+            response_cache = TMDBResponseCache(
+                settings.tmdb_cache_path,
+                max_age_seconds=settings.tmdb_cache_max_age_seconds,
+                offline=args.tmdb_cache_offline
+            )
         
-        # Fetch and store films
-        films_added, films_updated = await fetch_and_store_films(
-            db, 
-            tmdb_service,
-            num_pages=20  # Fetch 20 pages (400 films) for faster startup
-        )
+        async with TMDBService(
+            base_url=args.tmdb_base_url,
+            response_cache=response_cache
+        ) as tmdb_service:
+            # Fetch and store films
+            films_added, films_updated = await fetch_and_store_films(
+                db, 
+                tmdb_service,
+                num_pages=args.pages,
+                concurrency=args.concurrency
+            )
         
         # Compute similarities
         if films_added > 0 or films_updated > 0:
-            similarities_created = compute_and_store_similarities(db)
+            similarities_created = compute_and_store_similarities(
+                db,
+                incremental=args.incremental
+            )
         else:
             print("⚠️  No films to compute similarities for")
         
@@ -0,0 +1,137 @@
+"""
+Local stub of the TMDB endpoints used by populate_db.py.
+
+Serves deterministic fake films (with ETags) so the ingestion pipeline can
+be exercised offline, with optional latency and injected 429/503 errors:
+
+    python scripts/tmdb_stub_server.py --port 8765 --error-rate 0.1
+    python scripts/populate_db.py --tmdb-base-url http://127.0.0.1:8765/3
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+GENRES = ["Action", "Aventure", "Comédie", "Drame", "Horreur", "Science-Fiction", "Thriller"]
+FILMS_PER_PAGE = 20
+
+
+def fake_details(tmdb_id: int, append: set) -> dict:
+    """Deterministic film details for a TMDB id."""
+    rng = random.Random(tmdb_id)
+    year = rng.randint(1970, 2024)
+    details = {
+        "id": tmdb_id,
+        "title": f"Film {tmdb_id}",
+        "original_title": f"Movie {tmdb_id}",
+        "original_language": rng.choice(["fr", "en", "es", "ja"]),
+        "release_date": f"{year}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "genres": [{"id": i, "name": name} for i, name in enumerate(rng.sample(GENRES, 2))],
+        "poster_path": f"/poster{tmdb_id}.jpg",
+        "popularity": round(rng.uniform(1, 500), 3),
+        "vote_average": round(rng.uniform(3, 9), 1),
+        "vote_count": rng.randint(10, 30000),
+        "overview": f"Synopsis du film {tmdb_id}.",
+    }
+    credits = {
+        "cast": [{"name": f"Acteur {rng.randint(1, 300)}"} for _ in range(8)],
+        "crew": [{"job": "Director", "name": f"Réalisateur {rng.randint(1, 80)}"}],
+    }
+    keywords = {"keywords": [{"name": f"mot-clé {rng.randint(1, 500)}"} for _ in range(5)]}
+
+    if "credits" in append:
+        details["credits"] = credits
+    if "keywords" in append:
+        details["keywords"] = keywords
+    return details
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Request handler answering a subset of the TMDB v3 API."""
+
+    error_rate = 0.0
+    latency = 0.0
+
+    def _send(self, status: int, payload: dict, headers: dict = None):
+        body = json.dumps(payload).encode("utf-8")
+        headers = dict(headers or {})
+
+        # Support conditional requests like the real API
+        if status == 200:
+            etag = f'"{hashlib.md5(body).hexdigest()}"'
+            headers["ETag"] = etag
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+        if random.random() < self.error_rate:
+            if random.random() < 0.5:
+                return self._send(429, {"status_code": 25}, {"Retry-After": "1"})
+            return self._send(503, {"status_code": 9})
+
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        path = url.path.removeprefix("/3")
+
+        if path == "/movie/popular":
+            page = int(params.get("page", ["1"])[0])
+            first = (page - 1) * FILMS_PER_PAGE + 1
+            return self._send(200, {
+                "page": page,
+                "results": [{"id": tmdb_id} for tmdb_id in range(first, first + FILMS_PER_PAGE)],
+                "total_pages": 500,
+            })
+
+        match = re.fullmatch(r"/movie/(\d+)(/credits|/keywords)?", path)
+        if match:
+            tmdb_id = int(match.group(1))
+            if match.group(2) == "/credits":
+                return self._send(200, fake_details(tmdb_id, {"credits"})["credits"])
+            if match.group(2) == "/keywords":
+                return self._send(200, fake_details(tmdb_id, {"keywords"})["keywords"])
+            append = set(params.get("append_to_response", [""])[0].split(","))
+            return self._send(200, fake_details(tmdb_id, append))
+
+        return self._send(404, {"status_code": 34})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local TMDB stub server.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Fraction of requests answered with 429/503")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds of latency added to every response")
+    args = parser.parse_args()
+
+    StubHandler.error_rate = args.error_rate
+    StubHandler.latency = args.latency
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), StubHandler)
+    print(f"🧪 TMDB stub listening on http://127.0.0.1:{args.port}/3")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+import os
+
+# Settings require a TMDB key; tests never call TMDB
+os.environ.setdefault("TMDB_API_KEY", "test")
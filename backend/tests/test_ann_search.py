@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from scipy import sparse
+from sklearn.preprocessing import normalize
+from app.services.ann_search import LSHIndex, auto_bits
+from app.services.similarity_search import iter_top_k
+
+TOP_N = 10
+
+
+@pytest.fixture(scope="module")
+def matrix():
+    """Sparse vectors of 2000 films in groups sharing most of their terms."""
+    rng = np.random.default_rng(0)
+    n_films, n_terms = 2000, 5000
+    group_terms = rng.integers(0, n_terms, (n_films // 20, 30))
+    groups = rng.integers(0, len(group_terms), n_films)
+
+    columns = np.concatenate([
+        group_terms[groups[:, None], rng.integers(0, 30, (n_films, 15))],
+        rng.integers(0, n_terms, (n_films, 5)),
+    ], axis=1)
+    rows = np.repeat(np.arange(n_films), columns.shape[1])
+    matrix = sparse.csr_matrix(
+        (rng.random(columns.size), (rows, columns.ravel())), shape=(n_films, n_terms)
+    )
+    matrix.sum_duplicates()
+    return matrix
+
+
+def test_lsh_recall_of_exact_neighbours(matrix):
+    positions = np.arange(0, matrix.shape[0], 10)
+    exact = {
+        i: set(indices.tolist())
+        for i, indices, _ in iter_top_k(
+            matrix[positions], matrix, top_n=TOP_N, self_indices=positions
+        )
+    }
+
+    index = LSHIndex.build(matrix, n_components=32, n_tables=16, n_bits=8, seed=0)
+    # Approximate: only a small share of the catalog is scored
+    queries, _ = index.candidates(positions, max_bucket=1000)
+    assert len(queries) < 0.2 * len(positions) * matrix.shape[0]
+
+    vectors = normalize(matrix)
+    found = 0
+    for i, indices, scores in index.iter_top_k(TOP_N, positions=positions):
+        assert positions[i] not in indices
+        assert len(indices) <= TOP_N
+        assert np.all(np.diff(scores) <= 1e-6)
+        # Candidates are scored exactly
+        expected = vectors[indices] @ vectors[positions[i]].T
+        np.testing.assert_allclose(scores, expected.toarray().ravel(), rtol=1e-5)
+        found += len(exact[i].intersection(indices.tolist()))
+
+    recall = found / sum(len(neighbours) for neighbours in exact.values())
+    assert recall >= 0.9
+
+
+def test_auto_bits_targets_small_buckets():
+    assert auto_bits(0) == 1
+    assert auto_bits(64 * 2 ** 10) == 10
+    assert auto_bits(10 ** 30) == 62
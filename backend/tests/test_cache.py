@@ -0,0 +1,377 @@
+import asyncio
+import json
+import fakeredis
+import pytest
+from app.utils import cache
+
+
+async def _redis_unavailable():
+    # Like a failed connection attempt, yield to the loop before failing
+    await asyncio.sleep(0)
+    raise ConnectionError("Redis is down")
+
+
+@pytest.fixture(autouse=True)
+def clean_cache():
+    cache._local_cache.delete_matching()
+    cache._inflight.clear()
+    yield
+    cache._local_cache.delete_matching()
+    cache._inflight.clear()
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    client = fakeredis.aioredis.FakeRedis(decode_responses=False)
+
+    async def get_redis():
+        return client
+
+    monkeypatch.setattr(cache, "get_redis", get_redis)
+    return client
+
+
+def test_concurrent_misses_share_one_compute_when_redis_is_down(monkeypatch):
+    monkeypatch.setattr(cache, "get_redis", _redis_unavailable)
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return [1, 2]
+
+    async def run():
+        return await asyncio.gather(
+            cache.get_or_compute_cached("k", compute),
+            cache.get_or_compute_cached("k", compute),
+            return_exceptions=True
+        )
+
+    assert asyncio.run(run()) == [[1, 2], [1, 2]]
+    assert calls == 1
+    assert cache._inflight == {}
+
+
+def test_compute_error_reaches_every_waiter(monkeypatch):
+    monkeypatch.setattr(cache, "get_redis", _redis_unavailable)
+
+    async def compute():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def run():
+        return await asyncio.gather(
+            *(cache.get_or_compute_cached("k", compute) for _ in range(3)),
+            return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert cache._inflight == {}
+
+
+def test_stampede_computes_once(fake_redis):
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"films": [1, 2, 3]}
+
+    async def run():
+        results = await asyncio.gather(
+            *(cache.get_or_compute_cached("k", compute) for _ in range(50))
+        )
+        # Later calls are served from Redis
+        cache._local_cache.delete_matching()
+        results.append(await cache.get_or_compute_cached("k", compute))
+        return results
+
+    assert asyncio.run(run()) == [{"films": [1, 2, 3]}] * 51
+    assert calls == 1
+
+
+def test_stale_entry_is_served_while_refreshing(fake_redis, monkeypatch):
+    async def compute_old():
+        return "old"
+
+    async def compute_new():
+        await asyncio.sleep(0.01)
+        return "new"
+
+    async def run():
+        await cache.get_or_compute_cached("k", compute_old, ttl=60)
+        cache._local_cache.delete_matching()
+        monkeypatch.setattr(cache.CacheEntry, "should_refresh", lambda self: True)
+        return await asyncio.gather(
+            cache.get_or_compute_cached("k", compute_new),
+            cache.get_or_compute_cached("k", compute_new)
+        )
+
+    # One caller refreshes, the other gets the stale value meanwhile
+    assert sorted(asyncio.run(run())) == ["new", "old"]
+
+
+def test_namespace_generation_only_moves_forward(fake_redis):
+    async def run():
+        assert await cache.set_namespace_generation("similarities", 5)
+        key = await cache.namespaced_key("similarities", "similar:1:2")
+
+        # A worker still serving an older version cannot roll it back
+        cache._local_cache.delete_matching()
+        assert not await cache.set_namespace_generation("similarities", 4)
+        assert await cache.namespaced_key("similarities", "similar:1:2") == key
+
+        cache._local_cache.delete_matching()
+        assert not await cache.set_namespace_generation("similarities", 5)
+        assert await cache.set_namespace_generation("similarities", 6)
+        return key, await cache.namespaced_key("similarities", "similar:1:2")
+
+    old_key, new_key = asyncio.run(run())
+    assert old_key == "similarities:5:similar:1:2"
+    assert new_key == "similarities:6:similar:1:2"
+
+
+def test_invalidate_namespace_changes_keys(fake_redis):
+    async def run():
+        before = await cache.namespaced_key("popular", "page:1")
+        await cache.invalidate_namespace("popular")
+        return before, await cache.namespaced_key("popular", "page:1")
+
+    before, after = asyncio.run(run())
+    assert before != after
+
+
+def test_waiters_take_over_when_the_lock_holder_fails(fake_redis, monkeypatch):
+    monkeypatch.setattr(cache.settings, "cache_lock_timeout_seconds", 2.0)
+    monkeypatch.setattr(cache.settings, "cache_lock_poll_seconds", 0.01)
+
+    async def compute():
+        return "value"
+
+    async def run():
+        # Another worker holds the lock, then its compute raises
+        await fake_redis.set(cache._lock_key("k"), "other-worker")
+
+        async def holder_fails():
+            await asyncio.sleep(0.05)
+            await fake_redis.delete(cache._lock_key("k"))
+
+        started_at = asyncio.get_running_loop().time()
+        value, _ = await asyncio.gather(
+            cache.get_or_compute_cached("k", compute), holder_fails()
+        )
+        return value, asyncio.get_running_loop().time() - started_at
+
+    value, elapsed = asyncio.run(run())
+    assert value == "value"
+    assert elapsed < 0.5
+
+
+def test_waiters_use_the_value_of_the_lock_holder(fake_redis, monkeypatch):
+    monkeypatch.setattr(cache.settings, "cache_lock_poll_seconds", 0.01)
+
+    async def compute_holder():
+        return "holder"
+
+    async def compute():
+        raise AssertionError("the holder's value should be used")
+
+    async def run():
+        await fake_redis.set(cache._lock_key("k"), "other-worker")
+
+        async def holder_succeeds():
+            await asyncio.sleep(0.05)
+            await cache._compute_and_store("k", compute_holder, ttl=60)
+            cache._local_cache.delete_matching()
+            await fake_redis.delete(cache._lock_key("k"))
+
+        value, _ = await asyncio.gather(
+            cache.get_or_compute_cached("k", compute), holder_succeeds()
+        )
+        return value
+
+    assert asyncio.run(run()) == "holder"
+
+
+def test_namespaced_keys_read_the_generation_once(fake_redis, monkeypatch):
+    monkeypatch.setattr(cache, "_local_cache", cache.LocalCache(0))
+    reads = 0
+    get = fake_redis.get
+
+    async def counting_get(key):
+        nonlocal reads
+        reads += 1
+        return await get(key)
+
+    monkeypatch.setattr(fake_redis, "get", counting_get)
+
+    async def run():
+        await cache.set_namespace_generation("similarities", 3)
+        return await cache.namespaced_keys(
+            "similarities", {film_id: f"similar:{film_id}:2" for film_id in range(50)}
+        )
+
+    keys = asyncio.run(run())
+    assert keys[7] == "similarities:3:similar:7:2"
+    assert reads == 1
+
+
+def _returning(value):
+    async def compute():
+        return value
+    return compute
+
+
+def _batch_compute(calls: list, known=range(100)):
+    """compute_missing returning item * 10 for known items, recording each call."""
+    async def compute_missing(items):
+        calls.append(sorted(items))
+        await asyncio.sleep(0.01)
+        return {item: item * 10 for item in items if item in known}
+    return compute_missing
+
+
+def _values(entries):
+    return {item: entry.value for item, entry in entries.items()}
+
+
+def test_batch_computes_only_misses_in_one_call(fake_redis):
+    calls = []
+    compute_missing = _batch_compute(calls)
+
+    async def run():
+        await cache.get_or_compute_cached("item:2", _returning(20))
+        first = await cache.get_or_compute_many(
+            {item: f"item:{item}" for item in (1, 2, 3)}, compute_missing
+        )
+        cache._local_cache.delete_matching()
+        second = await cache.get_or_compute_many(
+            {item: f"item:{item}" for item in (1, 2, 3)}, compute_missing
+        )
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert _values(first) == _values(second) == {1: 10, 2: 20, 3: 30}
+    assert calls == [[1, 3]]
+
+
+def test_batch_caches_items_left_out_as_absent(fake_redis):
+    calls = []
+    compute_missing = _batch_compute(calls, known={1})
+
+    async def single():
+        return "single"
+
+    async def run():
+        keys = {item: f"item:{item}" for item in (1, 404)}
+        first = await cache.get_or_compute_many(keys, compute_missing)
+        cache._local_cache.delete_matching()
+        second = await cache.get_or_compute_many(keys, compute_missing)
+        # The single-key path treats absent markers as misses
+        return first, second, await cache.get_or_compute_cached("item:404", single)
+
+    first, second, single_value = asyncio.run(run())
+    assert _values(first) == _values(second) == {1: 10}
+    assert calls == [[1, 404]]
+    assert single_value == "single"
+
+
+def test_concurrent_batches_compute_each_item_once(fake_redis):
+    calls = []
+    compute_missing = _batch_compute(calls)
+
+    async def run():
+        return await asyncio.gather(
+            cache.get_or_compute_many({item: f"item:{item}" for item in (1, 2)}, compute_missing),
+            cache.get_or_compute_many({item: f"item:{item}" for item in (2, 3)}, compute_missing),
+            cache.get_or_compute_cached("item:3", _returning(30)),
+        )
+
+    first, second, single_value = asyncio.run(run())
+    assert _values(first) == {1: 10, 2: 20}
+    assert _values(second) == {2: 20, 3: 30}
+    assert single_value == 30
+    assert sorted(item for call in calls for item in call) == [1, 2, 3]
+    assert cache._inflight == {}
+
+
+def test_batch_serves_stale_entries_locked_by_another_worker(fake_redis, monkeypatch):
+    calls = []
+    compute_missing = _batch_compute(calls)
+
+    async def run():
+        await cache.get_or_compute_cached("item:1", _returning("old"))
+        cache._local_cache.delete_matching()
+        monkeypatch.setattr(cache.CacheEntry, "should_refresh", lambda self: True)
+        await fake_redis.set(cache._lock_key("item:1"), "other-worker")
+        return await cache.get_or_compute_many({1: "item:1", 2: "item:2"}, compute_missing)
+
+    assert _values(asyncio.run(run())) == {1: "old", 2: 20}
+    assert calls == [[2]]
+
+
+def test_batch_takes_over_when_the_lock_holder_fails(fake_redis, monkeypatch):
+    monkeypatch.setattr(cache.settings, "cache_lock_poll_seconds", 0.01)
+    calls = []
+    compute_missing = _batch_compute(calls)
+
+    async def run():
+        await fake_redis.set(cache._lock_key("item:1"), "other-worker")
+
+        async def holder_fails():
+            await asyncio.sleep(0.05)
+            await fake_redis.delete(cache._lock_key("item:1"))
+
+        entries, _ = await asyncio.gather(
+            cache.get_or_compute_many({1: "item:1", 2: "item:2"}, compute_missing),
+            holder_fails()
+        )
+        return entries
+
+    assert _values(asyncio.run(run())) == {1: 10, 2: 20}
+    assert calls == [[2], [1]]
+
+
+def test_local_cache_follows_generation_bumps_of_other_workers(fake_redis):
+    async def run():
+        listener = asyncio.create_task(cache.listen_for_invalidations())
+        try:
+            before = await cache.namespaced_key("popular", "page:1")
+            await asyncio.sleep(0.05)  # Let the listener subscribe
+
+            # Another worker bumps the generation and publishes it
+            await fake_redis.set("ns:popular", 7)
+            await fake_redis.publish(cache.INVALIDATION_CHANNEL, json.dumps({
+                "origin": "other-worker", "keys": ["ns:popular"], "pattern": None
+            }))
+            for _ in range(100):
+                if cache._local_cache.get("ns:popular") is cache.MISSING:
+                    break
+                await asyncio.sleep(0.01)
+            return before, await cache.namespaced_key("popular", "page:1")
+        finally:
+            listener.cancel()
+
+    before, after = asyncio.run(run())
+    assert before == "popular:0:page:1"
+    assert after == "popular:7:page:1"
+
+
+def test_local_cache_ignores_its_own_invalidations(fake_redis):
+    async def run():
+        listener = asyncio.create_task(cache.listen_for_invalidations())
+        try:
+            await cache.namespaced_key("popular", "page:1")
+            await asyncio.sleep(0.05)
+            await fake_redis.publish(cache.INVALIDATION_CHANNEL, json.dumps({
+                "origin": cache._WORKER_ID, "keys": ["ns:popular"], "pattern": None
+            }))
+            await asyncio.sleep(0.05)
+            return cache._local_cache.get("ns:popular")
+        finally:
+            listener.cancel()
+
+    assert asyncio.run(run()) == 0
@@ -0,0 +1,92 @@
+import json
+import pytest
+from app.utils import cache_codec
+from app.utils.cache_codec import (
+    COMPRESSORS,
+    SERIALIZERS,
+    CacheCodec,
+    CacheCodecError,
+    join_json_array,
+    join_json_object,
+)
+
+VALUE = {
+    "films": [{"id": i, "titre": f"Film {i}", "score": i / 3, "genres": ["Drame"]} for i in range(200)],
+    "next_cursor": None,
+    "total": 200,
+}
+
+
+@pytest.mark.parametrize("compressor", COMPRESSORS)
+@pytest.mark.parametrize("serializer", SERIALIZERS)
+def test_round_trip(serializer, compressor):
+    codec = CacheCodec(serializer, compressor, compress_min_bytes=64)
+
+    data = codec.encode(VALUE)
+
+    assert codec.decode(data) == VALUE
+    assert json.loads(codec.decode_json(data)) == VALUE
+    if codec.compressor != cache_codec.NONE:
+        assert len(data) < len(json.dumps(VALUE))
+
+
+def test_small_values_are_not_compressed():
+    codec = CacheCodec("json", "zlib", compress_min_bytes=2048)
+
+    data = codec.encode([1, 2, 3])
+
+    assert data[0] & 0x0F == cache_codec.NONE
+    assert codec.decode(data) == [1, 2, 3]
+
+
+def test_json_payloads_are_served_without_parsing():
+    codec = CacheCodec("json", "none", compress_min_bytes=0)
+
+    assert codec.decode_json(codec.encode({"a": [1, 2]})) == b'{"a":[1,2]}'
+
+
+def test_values_stay_readable_after_a_configuration_change():
+    old = CacheCodec("json", "zlib", compress_min_bytes=0)
+    new = CacheCodec("orjson", "none", compress_min_bytes=0)
+
+    assert new.decode(old.encode(VALUE)) == VALUE
+
+
+@pytest.mark.parametrize("serializer, compressor, library", [
+    ("msgpack", "none", "serializer"),
+    ("orjson", "none", "serializer"),
+    ("json", "zstd", "compressor"),
+    ("json", "lz4", "compressor"),
+])
+def test_missing_libraries_fall_back_to_json_and_zlib(monkeypatch, serializer, compressor, library):
+    if library == "serializer":
+        monkeypatch.delitem(cache_codec._serializers, SERIALIZERS[serializer], raising=False)
+    else:
+        monkeypatch.delitem(cache_codec._compressors, COMPRESSORS[compressor], raising=False)
+
+    codec = CacheCodec(serializer, compressor, compress_min_bytes=0)
+
+    if library == "serializer":
+        assert codec.serializer == cache_codec.JSON
+    else:
+        assert codec.compressor == cache_codec.ZLIB
+    assert codec.decode(codec.encode(VALUE)) == VALUE
+
+
+def test_payloads_of_unavailable_formats_are_rejected(monkeypatch):
+    data = CacheCodec("json", "zlib", compress_min_bytes=0).encode(VALUE)
+    monkeypatch.delitem(cache_codec._compressors, cache_codec.ZLIB)
+
+    with pytest.raises(CacheCodecError):
+        CacheCodec("json", "none", compress_min_bytes=0).decode(data)
+
+
+@pytest.mark.parametrize("data", [b"", bytes([0xF0]) + b"{}", bytes([0x1F]) + b"{}"])
+def test_unknown_payloads_are_rejected(data):
+    with pytest.raises(CacheCodecError):
+        CacheCodec("json", "none", compress_min_bytes=0).decode(data)
+
+
+def test_join_json_documents():
+    assert json.loads(join_json_array([b"1", b'{"a":2}'])) == [1, {"a": 2}]
+    assert json.loads(join_json_object({1: b"[]", 2: b'"x"'})) == {"1": [], "2": "x"}
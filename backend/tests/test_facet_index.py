@@ -0,0 +1,71 @@
+import random
+import pytest
+from app.services.facet_index import RATING_THRESHOLDS, FacetIndex
+
+GENRES = ["Action", "Comedy", "Drama", "Horror", "Science-Fiction"]
+
+
+@pytest.fixture
+def rows():
+    rng = random.Random(0)
+    return [
+        (
+            rng.sample(GENRES, rng.randint(0, 3)),
+            rng.choice([None, 1999, 2005, 2010, 2024]),
+            rng.choice([None, 0.0, 4.5, 6.0, 7.2, 8.9, 10.0]),
+        )
+        for _ in range(1003)  # not a multiple of 8: exercises bitset padding
+    ]
+
+
+def _matches(row, genre=None, year=None, min_rating=None):
+    genres, annee, rating = row
+    return (
+        (not genre or genre in genres)
+        and (not year or annee == year)
+        and (not min_rating or (rating or 0.0) >= min_rating)
+    )
+
+
+def _expected(rows, genre=None, year=None, min_rating=None):
+    """Facet counts computed film by film."""
+    def count(**filters):
+        return sum(_matches(row, **filters) for row in rows)
+
+    years = sorted({annee for _, annee, _ in rows if annee is not None})
+    return {
+        "total": count(genre=genre, year=year, min_rating=min_rating),
+        "genres": {g: count(genre=g, year=year, min_rating=min_rating) for g in GENRES},
+        "years": {y: count(genre=genre, year=y, min_rating=min_rating) for y in years},
+        "ratings": {
+            t: count(genre=genre, year=year, min_rating=t) for t in RATING_THRESHOLDS
+        },
+    }
+
+
+@pytest.mark.parametrize("filters", [
+    {},
+    {"genre": "Drama"},
+    {"year": 2010},
+    {"min_rating": 7},
+    {"min_rating": 6.5},
+    {"genre": "Comedy", "year": 2024, "min_rating": 5},
+    {"genre": "Western"},
+    {"year": 1950},
+])
+def test_counts_match_a_scan_of_the_films(rows, filters):
+    index = FacetIndex.from_rows(rows, version=1)
+
+    assert index.size == len(rows)
+    assert index.counts(**filters) == _expected(rows, **filters)
+
+
+def test_empty_catalog():
+    index = FacetIndex.from_rows([], version=0)
+
+    assert index.counts(genre="Drama") == {
+        "total": 0,
+        "genres": {},
+        "years": {},
+        "ratings": {t: 0 for t in RATING_THRESHOLDS},
+    }
@@ -0,0 +1,98 @@
+from collections import namedtuple
+import numpy as np
+import pytest
+from app.services.feature_store import FeatureStore
+from app.services.film_features import FIELDS, FilmFeaturizer, feature_hash, film_documents
+from app.services.recommendation_engine import RecommendationEngine
+
+FilmRow = namedtuple("FilmRow", "id titre genres keywords director actors overview")
+
+WEIGHTS = {field: 1.0 for field in FIELDS}
+
+
+def _films():
+    return [
+        FilmRow(1, "Alien", ["Horror", "Science Fiction"], ["space", "alien"],
+                "Ridley Scott", ["Sigourney Weaver"], "A crew meets a deadly creature in space."),
+        FilmRow(2, "Aliens", ["Action", "Science Fiction"], ["space", "marine"],
+                "James Cameron", ["Sigourney Weaver", "Michael Biehn"], "Ripley returns with marines."),
+        FilmRow(3, "Amélie", ["Comedy", "Romance"], ["paris"],
+                "Jean-Pierre Jeunet", ["Audrey Tautou"], "A shy waitress changes lives in Paris."),
+        FilmRow(4, "Heat", ["Crime", "Drama"], ["heist", "los angeles"],
+                "Michael Mann", ["Al Pacino", "Robert De Niro"], "A detective hunts a crew of thieves."),
+        FilmRow(5, "Untitled", [], None, None, None, None),
+    ]
+
+
+def _full_fit(films):
+    """Fit a featurizer on the films; returns (featurizer, blocks)."""
+    featurizer = FilmFeaturizer()
+    return featurizer, featurizer.fit_transform([film_documents(film) for film in films])
+
+
+@pytest.fixture
+def store(tmp_path):
+    """A feature store saved from a full fit of the initial catalog."""
+    films = _films()
+    featurizer, blocks = _full_fit(films)
+
+    store = FeatureStore(str(tmp_path / "features"))
+    store.save(
+        featurizer,
+        blocks,
+        [film.id for film in films],
+        [feature_hash(film_documents(film)) for film in films],
+        WEIGHTS
+    )
+    return store
+
+
+def test_save_load_round_trip(store):
+    assert store.exists()
+
+    featurizer = FilmFeaturizer()
+    blocks, film_ids, hashes, weights = store.load(featurizer)
+
+    assert film_ids.tolist() == [1, 2, 3, 4, 5]
+    assert weights == WEIGHTS
+    assert hashes == {
+        film.id: feature_hash(film_documents(film)) for film in _films()
+    }
+    _, expected = _full_fit(_films())
+    for field in FIELDS:
+        np.testing.assert_allclose(
+            blocks[field].toarray(), expected[field].toarray(), rtol=1e-6
+        )
+
+
+def test_incremental_blocks_match_a_full_transform(store):
+    films = _films()
+    films[1] = films[1]._replace(keywords=["space", "marine", "sequel"])  # changed
+    del films[3]  # removed
+    films.append(FilmRow(6, "Alien Resurrection", ["Science Fiction"], ["space", "clone"],
+                         "Jean-Pierre Jeunet", ["Sigourney Weaver"], "Ripley is cloned."))  # new
+
+    engine = RecommendationEngine()
+    blocks, film_ids, hashes, changed, removed_ids, weights = engine._current_blocks(films, store)
+
+    assert film_ids == [1, 2, 3, 5, 6]
+    assert changed == [1, 4]
+    assert removed_ids == [4]
+    assert weights == WEIGHTS
+    assert hashes == [feature_hash(film_documents(film)) for film in films]
+
+    # Every film, stored or not, is vectorized like a full transform with the
+    # stored vocabularies would
+    featurizer = FilmFeaturizer()
+    store.load(featurizer)
+    expected = featurizer.transform([film_documents(film) for film in films])
+    for field in FIELDS:
+        np.testing.assert_allclose(
+            blocks[field].toarray(), expected[field].toarray(), rtol=1e-6
+        )
+
+
+def test_older_formats_read_as_missing(store):
+    (store.path / "manifest.json").write_text('{"format": 1}', encoding="utf-8")
+
+    assert not store.exists()
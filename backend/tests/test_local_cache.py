@@ -0,0 +1,67 @@
+import pytest
+from app.utils import local_cache
+from app.utils.local_cache import MISSING, LocalCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.monotonic of the local cache."""
+    now = [1000.0]
+    monkeypatch.setattr(local_cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_get_set_and_miss():
+    cache = LocalCache(10)
+    cache.set("a", None, ttl=60)
+
+    assert cache.get("a") is None  # None is a value, not a miss
+    assert cache.get("b") is MISSING
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = LocalCache(3)
+    for key in "abc":
+        cache.set(key, key, ttl=60)
+
+    cache.get("a")  # "b" is now the least recently used
+    cache.set("d", "d", ttl=60)
+
+    assert len(cache) == 3
+    assert cache.get("b") is MISSING
+    assert [cache.get(key) for key in "acd"] == ["a", "c", "d"]
+
+
+def test_entries_expire_after_their_ttl(clock):
+    cache = LocalCache(10)
+    cache.set("short", 1, ttl=5)
+    cache.set("long", 2, ttl=60)
+
+    clock[0] += 5
+    assert cache.get("short") is MISSING
+    assert cache.get("long") == 2
+    assert len(cache) == 1
+
+
+def test_disabled_cache_stores_nothing():
+    cache = LocalCache(0)
+    cache.set("a", 1, ttl=60)
+
+    assert cache.get("a") is MISSING
+    LocalCache(10).set("b", 1, ttl=0)
+
+
+def test_delete_and_delete_matching():
+    cache = LocalCache(10)
+    for key in ("popular:1:a", "popular:1:b", "film:1", "film:2"):
+        cache.set(key, key, ttl=60)
+
+    cache.delete("film:1")
+    cache.delete("missing")
+    cache.delete_matching("popular:*")
+
+    assert cache.get("film:2") == "film:2"
+    assert len(cache) == 1
+
+    cache.delete_matching()
+    assert len(cache) == 0
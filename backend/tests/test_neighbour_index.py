@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from app.services.batch_recommendations import iter_batch_recommendations
+from app.services.neighbour_index import NeighbourIndex
+
+
+@pytest.fixture(scope="module")
+def index():
+    """Random neighbour lists over 300 films with non-contiguous ids."""
+    rng = np.random.default_rng(0)
+    n_films, n_neighbours = 300, 12
+    film_ids = np.sort(rng.choice(10000, n_films, replace=False)).astype(np.int32)
+
+    neighbours, scores = [], []
+    for position in range(n_films):
+        others = np.delete(np.arange(n_films), position)
+        neighbours.append(rng.choice(others, n_neighbours, replace=False))
+        # Multiples of 1/64 add up exactly in float32 and float64 alike
+        scores.append(-np.sort(-rng.integers(1, 64, n_neighbours) / 64.0))
+
+    return NeighbourIndex(
+        film_ids=film_ids,
+        offsets=np.arange(0, n_films * n_neighbours + 1, n_neighbours, dtype=np.int64),
+        neighbours=np.concatenate(neighbours).astype(np.int32),
+        scores=np.concatenate(scores).astype(np.float32),
+        vote_average=rng.choice([0.0, 5.0, 6.5, 8.0], n_films).astype(np.float32),
+        version=1
+    )
+
+
+@pytest.fixture(scope="module")
+def profiles(index):
+    """(selected, liked, disliked) profiles, with unknown and repeated ids."""
+    rng = np.random.default_rng(1)
+    ids = index.film_ids.tolist()
+    profiles = [([], [], []), ([ids[0]], [], []), ([99999], [], [ids[1]])]
+    for _ in range(200):
+        selected = rng.choice(ids, rng.integers(1, 6)).tolist()
+        liked = rng.choice(ids, rng.integers(0, 4)).tolist()
+        disliked = rng.choice(ids, rng.integers(0, 4)).tolist() + [-1]
+        profiles.append((selected, liked, disliked))
+    return profiles
+
+
+def _one_by_one(index, profiles, limit):
+    return [
+        index.recommend(selected + liked, disliked, limit)
+        for selected, liked, disliked in profiles
+    ]
+
+
+@pytest.mark.parametrize("limit", [1, 10])
+def test_batch_matches_single_recommendations(index, profiles, limit):
+    batch = index.recommend_batch(
+        [(selected + liked, disliked) for selected, liked, disliked in profiles],
+        limit
+    )
+
+    assert batch == _one_by_one(index, profiles, limit)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_streamed_batches_keep_input_order(index, profiles, workers):
+    streamed = list(iter_batch_recommendations(
+        index, iter(profiles), limit=10, workers=workers, chunk_size=16
+    ))
+
+    assert streamed == _one_by_one(index, profiles, 10)
+
+
+def test_with_ratings_updates_known_films_only(index):
+    film_ids = np.array([index.film_ids[0], index.film_ids[2], 10**6], dtype=np.int32)
+    vote_average = np.array([9.5, 1.0, 7.0], dtype=np.float32)
+    original = index.vote_average.copy()
+
+    updated = index.with_ratings(film_ids, vote_average, films_version=5)
+
+    expected = original.copy()
+    expected[[0, 2]] = [9.5, 1.0]
+    np.testing.assert_array_equal(updated.vote_average, expected)
+    assert updated.films_version == 5
+    assert updated.version == index.version
+    assert updated.neighbours is index.neighbours
+    np.testing.assert_array_equal(index.vote_average, original)
+    assert index.films_version == 0
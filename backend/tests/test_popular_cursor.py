@@ -0,0 +1,50 @@
+import base64
+import json
+import pytest
+from app.services.popular_films import InvalidCursor, decode_cursor, encode_cursor
+
+
+def _raw_cursor(payload) -> str:
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+@pytest.mark.parametrize("sort_by, values", [
+    ("recent_popular", [2024, 812.5, 1234]),
+    ("rating", [35210, 8.4, 7]),
+    ("popularity", [0.0, 99]),
+])
+def test_round_trip(sort_by, values):
+    cursor = encode_cursor(sort_by, values)
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor, sort_by) == values
+
+
+def test_cursor_of_another_sort_is_rejected():
+    cursor = encode_cursor("rating", [35210, 8.4, 7])
+
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, "recent_popular")
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    "é",
+    _raw_cursor("{not json"),
+    _raw_cursor("[1, 2, 3]"),
+    _raw_cursor('"popularity"'),
+    _raw_cursor(json.dumps({"s": "popularity"})),
+    _raw_cursor(json.dumps({"s": "popularity", "k": [1.0]})),
+    _raw_cursor(json.dumps({"s": "popularity", "k": [1.0, 2, 3]})),
+    _raw_cursor(json.dumps({"s": "popularity", "k": ["1.0", 2]})),
+    _raw_cursor(json.dumps({"s": "popularity", "k": {"a": 1}})),
+    _raw_cursor(json.dumps({"s": "unknown", "k": [1.0, 2]})),
+])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, "popularity")
+
+
+def test_unknown_sort_is_rejected():
+    with pytest.raises(InvalidCursor):
+        decode_cursor(encode_cursor("unknown", [1.0, 2]), "unknown")
@@ -0,0 +1,51 @@
+import asyncio
+import time
+from app.utils.rate_limit import TokenBucket
+
+
+def _timed(coroutine) -> float:
+    started_at = time.monotonic()
+    asyncio.run(coroutine)
+    return time.monotonic() - started_at
+
+
+def test_burst_up_to_capacity_then_rate():
+    bucket = TokenBucket(rate=50, capacity=5)
+
+    async def run():
+        for _ in range(10):
+            await bucket.acquire()
+
+    # 5 immediate tokens, then 5 more at 50 per second
+    assert 0.08 <= _timed(run()) < 0.3
+
+
+def test_default_capacity_is_one_second_of_tokens():
+    assert TokenBucket(rate=40).capacity == 40
+    assert TokenBucket(rate=0.5).capacity == 1
+
+
+def test_penalty_blocks_for_its_duration():
+    bucket = TokenBucket(rate=100, capacity=100)
+    bucket.penalize(0.1)
+
+    assert 0.1 <= _timed(bucket.acquire()) < 0.3
+
+
+def test_concurrent_penalties_do_not_add_up():
+    bucket = TokenBucket(rate=100, capacity=1)
+
+    # Many workers get Retry-After for the same window
+    for _ in range(16):
+        bucket.penalize(0.1)
+
+    assert bucket._tokens >= -10.0
+    assert _timed(bucket.acquire()) < 0.3
+
+
+def test_a_shorter_penalty_does_not_shorten_a_longer_one():
+    bucket = TokenBucket(rate=100, capacity=1)
+    bucket.penalize(0.2)
+    bucket.penalize(0.05)
+
+    assert _timed(bucket.acquire()) >= 0.2
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from scipy import sparse
+from sklearn.metrics.pairwise import cosine_similarity
+from app.services.similarity_search import iter_top_k
+
+TOP_N = 20
+
+
+@pytest.fixture(scope="module")
+def matrix():
+    """Random TF-IDF-like rows, with duplicated films and films without terms."""
+    rng = np.random.default_rng(0)
+    matrix = sparse.random(
+        300, 400, density=0.03, format="lil", random_state=rng, dtype=np.float64
+    )
+    for duplicate, original in [(10, 3), (11, 3), (12, 3), (50, 40), (299, 40)]:
+        matrix[duplicate] = matrix[original]
+    for empty in (7, 8, 100):
+        matrix[empty] = 0
+    return matrix.tocsr()
+
+
+def _dense_top_k(matrix, top_n):
+    """Dense cosine top-N of every row, self excluded, ties by lower position."""
+    scores = cosine_similarity(matrix)
+    positions = np.arange(matrix.shape[0])
+    neighbours = []
+    for row in positions:
+        order = np.lexsort((positions, -scores[row]))
+        order = order[order != row][:top_n]
+        neighbours.append((order, scores[row, order]))
+    return neighbours
+
+
+@pytest.mark.parametrize("memory_budget_mb", [1, 512])
+def test_blocked_top_k_matches_the_dense_ranking(matrix, memory_budget_mb, monkeypatch):
+    if memory_budget_mb == 1:
+        # Force many small blocks
+        monkeypatch.setattr(
+            "app.services.similarity_search.block_rows_for_budget",
+            lambda n_columns, budget: 7
+        )
+    expected = _dense_top_k(matrix, TOP_N)
+    positions = np.arange(matrix.shape[0])
+
+    rows = list(iter_top_k(
+        matrix, matrix, TOP_N,
+        memory_budget_mb=memory_budget_mb, self_indices=positions
+    ))
+
+    assert [row for row, _, _ in rows] == positions.tolist()
+    for row, indices, scores in rows:
+        np.testing.assert_array_equal(indices, expected[row][0])
+        np.testing.assert_allclose(scores, expected[row][1], atol=1e-12)
+
+
+def test_ties_go_to_the_lower_position(matrix):
+    positions = np.arange(matrix.shape[0])
+    rows = {row: indices for row, indices, _ in iter_top_k(
+        matrix, matrix, TOP_N, self_indices=positions
+    )}
+
+    # Exact duplicates tie at 1.0, films without terms tie at 0
+    assert rows[3][:3].tolist() == [10, 11, 12]
+    assert rows[40][:2].tolist() == [50, 299]
+    assert rows[7].tolist() == [i for i in range(TOP_N + 1) if i != 7]
+
+
+def test_top_n_is_capped_by_the_corpus():
+    matrix = sparse.csr_matrix(np.eye(3))
+    rows = list(iter_top_k(matrix, matrix, TOP_N, self_indices=np.arange(3)))
+
+    assert [len(indices) for _, indices, _ in rows] == [2, 2, 2]
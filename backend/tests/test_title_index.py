@@ -0,0 +1,75 @@
+from types import SimpleNamespace
+import pytest
+from app.services.title_index import TitleIndex, fold_title
+
+
+def _film(film_id, titre, titre_original=None):
+    return SimpleNamespace(
+        id=film_id, tmdb_id=film_id, titre=titre, titre_original=titre_original,
+        annee=None, genres=[], poster_url=None, popularity=0.0,
+        vote_average=0.0, vote_count=0, overview=None
+    )
+
+
+@pytest.fixture(scope="module")
+def index():
+    # Most popular first, as TitleIndex.load orders them
+    return TitleIndex.from_films([
+        _film(1, "Le Fabuleux Destin d'Amélie Poulain", "Amélie"),
+        _film(2, "Alien"),
+        _film(3, "De rouille et d'os"),
+        _film(4, "Un cœur en hiver"),
+        _film(5, "Aliens, le retour", "Aliens"),
+        _film(6, "Amélie et la métaphysique des tubes"),
+        _film(7, "Cœurs"),
+    ], version=1)
+
+
+def _ids(films):
+    return [film.id for film in films]
+
+
+def test_fold_title():
+    assert fold_title("AMÉLIE") == "amelie"
+    assert fold_title("Cœur") == "coeur"
+    assert fold_title("Ærø") == "aero"
+
+
+def test_folds_accents_case_and_ligatures(index):
+    assert _ids(index.search("AMÉ", 10)) == [1, 6]
+    assert _ids(index.search("ame", 10)) == [1, 6]
+    assert _ids(index.search("coeur", 10)) == [7, 4]
+    assert _ids(index.search("CŒUR", 10)) == [7, 4]
+
+
+def test_prefix_matches_come_before_substring_matches(index):
+    # "Cœurs" starts with the query, "Un cœur en hiver" only contains it
+    assert _ids(index.search("coeur", 10)) == [7, 4]
+    # Both kinds are ordered by popularity within their group
+    assert _ids(index.search("ali", 10)) == [2, 5]
+    assert _ids(index.search("lie", 10)) == [1, 2, 5, 6]
+
+
+def test_original_titles_are_searched(index):
+    assert _ids(index.search("aliens", 10)) == [5]
+
+
+def test_limit(index):
+    assert _ids(index.search("lie", 2)) == [1, 2]
+    assert _ids(index.search("a", 1)) == [1]
+
+
+def test_short_queries_match_prefixes_only(index):
+    # "os" is inside "De rouille et d'os" but too short for substring search
+    assert _ids(index.search("os", 10)) == []
+    assert _ids(index.search("d'os", 10)) == [3]
+
+
+@pytest.mark.parametrize("query", ["", "   ", "́"])
+def test_blank_queries_match_nothing(index, query):
+    assert index.search(query, 10) == []
+
+
+def test_unknown_titles(index):
+    assert index.search("zzz", 10) == []
+    assert index.search("alienz", 10) == []
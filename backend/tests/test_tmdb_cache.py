@@ -0,0 +1,19 @@
+from app.services.tmdb_cache import TMDBResponseCache
+
+
+def test_keys_ignore_param_order_and_api_key():
+    first = TMDBResponseCache.make_key("https://api.test/3", "/movie/1", {"a": 1, "b": 2, "api_key": "x"})
+    second = TMDBResponseCache.make_key("https://api.test/3/", "/movie/1", {"b": 2, "a": 1, "api_key": "y"})
+    assert first == second
+
+
+def test_responses_are_scoped_to_the_base_url(tmp_path):
+    cache = TMDBResponseCache(str(tmp_path / "tmdb.sqlite"), max_age_seconds=3600)
+    stub_key = cache.make_key("http://127.0.0.1:8765/3", "/movie/1", {})
+    real_key = cache.make_key("https://api.themoviedb.org/3", "/movie/1", {})
+
+    cache.put(stub_key, {"title": "Film 1"})
+
+    assert cache.get(stub_key).body == {"title": "Film 1"}
+    assert cache.get(real_key) is None
+    cache.close()
@@ -56,6 +56,22 @@ export default {
     return response.data
   },
 
+  async getFilmsBatch(filmIds) {
+    const response = await apiClient.get('/films/batch', {
+      params: { ids: filmIds },
+      paramsSerializer: { indexes: null },
+    })
+    return response.data
+  },
+
+  async getSimilarFilmsBatch(filmIds, limit = 2) {
+    const response = await apiClient.get('/films/batch/similar', {
+      params: { ids: filmIds, limit },
+      paramsSerializer: { indexes: null },
+    })
+    return response.data
+  },
+
   async getRecommendations(data) {
     const response = await apiClient.post('/films/recommendations', data)
     return response.data
@@ -63,6 +63,22 @@ export const useFilmStore = defineStore('film', () => {
     }
   }
 
+  async function getSimilarFilmsBatch(filmIds) {
+    if (filmIds.length === 0) return {}
+
+    loading.value = true
+    error.value = null
+    try {
+      const data = await api.getSimilarFilmsBatch(filmIds)
+      return data
+    } catch (err) {
+      error.value = err.message
+      throw err
+    } finally {
+      loading.value = false
+    }
+  }
+
   async function fetchRecommendations() {
     if (!canGetRecommendations.value) {
       throw new Error('At least one film must be selected')
@@ -202,6 +218,7 @@ export const useFilmStore = defineStore('film', () => {
     fetchPopularFilms,
     searchFilms,
     getSimilarFilms,
+    getSimilarFilmsBatch,
     fetchRecommendations,
     fetchMetadata,
     addSelectedFilm,